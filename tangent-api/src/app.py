@@ -2,6 +2,7 @@ from flask import Flask, request
 from flask_cors import CORS
 from routes.api import api_bp
 from utils import ensure_directories
+from services.http_cache import compress_response
 from services.background_tasks import start_background_tasks
 
 app = Flask(__name__)
@@ -20,6 +21,7 @@ def before_request():
 
 @app.after_request
 def after_request(response):
+    response = compress_response(response)
     print("Outgoing response:")
     print(f"Status: {response.status_code}")
     print(f"Headers: {dict(response.headers)}")
@@ -3,12 +3,94 @@ import os
 # Configuration settings
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-minilm")
 GENERATION_MODEL = os.getenv("GENERATION_MODEL", "qwen2.5-coder:7b")
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+
+# Generation client settings, concurrency defaults to Ollama's parallel slots
+GENERATION_CONCURRENCY = int(
+    os.getenv("GENERATION_CONCURRENCY", os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+)
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "120"))
+
+# Topic labelling: "batched" labels several clusters per structured JSON
+# prompt and falls back to one prompt per cluster, "single" always uses one
+TOPIC_LABELLING_MODE = os.getenv("TOPIC_LABELLING_MODE", "batched")
+TOPIC_BATCH_SIZE = int(os.getenv("TOPIC_BATCH_SIZE", "10"))
+TOPIC_BATCH_MAX_TITLES = int(os.getenv("TOPIC_BATCH_MAX_TITLES", "15"))
+
+# Embedding client settings
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "120"))
 
 # Directory paths
 BASE_DATA_DIR = "./processed_data"
 CLAUDE_DATA_DIR = os.path.join(BASE_DATA_DIR, "claude")
 CHATGPT_DATA_DIR = os.path.join(BASE_DATA_DIR, "chatgpt")
 
+# Embedding cache settings
+EMBEDDING_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR", os.path.join(BASE_DATA_DIR, "embedding_cache")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# LLM response cache settings
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH", os.path.join(BASE_DATA_DIR, "llm_cache.sqlite3")
+)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 60 * 60)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+
+# Memory budget for parsed artifacts served by the API, measured by the size
+# of the cached files on disk
+ARTIFACT_CACHE_MAX_BYTES = int(
+    os.getenv("ARTIFACT_CACHE_MAX_BYTES", str(256 * 1024 * 1024))
+)
+
+# HTTP response compression: responses smaller than the minimum are sent as is
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+
+# Level-of-detail map: grid pyramid depth, the most points returned before
+# switching to cluster blobs, and at most how many cells span a viewport
+LOD_LEVELS = int(os.getenv("LOD_LEVELS", "8"))
+LOD_POINT_LIMIT = int(os.getenv("LOD_POINT_LIMIT", "5000"))
+LOD_TARGET_CELLS = int(os.getenv("LOD_TARGET_CELLS", "16"))
+
+# Struggle detection: optional file with one phrase per line replacing the
+# built-in phrases, and the number of messages scanned per chunk
+STRUGGLE_PHRASES_FILE = os.getenv("STRUGGLE_PHRASES_FILE")
+STRUGGLE_DETECTION_CHUNK_SIZE = int(
+    os.getenv("STRUGGLE_DETECTION_CHUNK_SIZE", "50000")
+)
+
+# Most recent struggle messages per cluster sent to the reflection prompt
+REFLECTION_MAX_MESSAGES = int(os.getenv("REFLECTION_MAX_MESSAGES", "20"))
+
+# Messages kept per topic in the precomputed identify-messages rankings
+TOPIC_MESSAGES_TOP_N = int(os.getenv("TOPIC_MESSAGES_TOP_N", "20"))
+
+# Number of recent /get-reflections contexts whose embeddings are kept
+REFLECTION_CONTEXT_CACHE_SIZE = int(os.getenv("REFLECTION_CONTEXT_CACHE_SIZE", "256"))
+
+# Projection settings: "incremental" reuses the fitted UMAP across months,
+# "full" refits on all accumulated embeddings every month
+PROJECTION_MODE = os.getenv("PROJECTION_MODE", "incremental")
+PROJECTION_REFIT_THRESHOLD = float(os.getenv("PROJECTION_REFIT_THRESHOLD", "0.5"))
+
+# Clustering settings: "dense" clusters a precomputed n x n cosine distance
+# matrix, "sparse" clusters normalized embeddings directly with memory that
+# grows linearly, "auto" switches to sparse above the threshold
+CLUSTERING_MODE = os.getenv("CLUSTERING_MODE", "auto")
+CLUSTERING_SPARSE_THRESHOLD = int(os.getenv("CLUSTERING_SPARSE_THRESHOLD", "5000"))
+
+# Minimum membership overlap (Jaccard) for a cluster to carry over its topic
+# label and reflection from the previous month
+LINEAGE_MIN_OVERLAP = float(os.getenv("LINEAGE_MIN_OVERLAP", "0.5"))
+
+# Number of processes used to lay out months in parallel (1 = serial)
+PROCESSING_WORKERS = int(os.getenv("PROCESSING_WORKERS", "1"))
+
 # Required files for processing
 REQUIRED_FILES = [
     "analytics.json",
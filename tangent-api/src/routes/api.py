@@ -4,20 +4,53 @@ import os
 from pathlib import Path
 import re
 import traceback
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 import numpy as np
-import pandas as pd
-from torch import cosine_similarity
-from services.embedding import get_embeddings
-from services.background_processor import BackgroundProcessor
+from services.artifact_cache import get_artifact_cache, read_bytes
+from services.http_cache import (
+    artifact_etag,
+    is_not_modified,
+    not_modified,
+    tag_response,
+)
+from services.points_binary import MIMETYPE as POINTS_MIMETYPE, encode_points
+from services.spatial_index import (
+    INDEX_FILE as SPATIAL_INDEX_FILE,
+    load_spatial_index,
+    query_spatial_index,
+)
+from services.reflection_index import (
+    embed_context,
+    load_reflection_index,
+    top_reflections,
+)
+from services.topic_rankings import TOPIC_MESSAGES_FILE, rerank_by_context
+from services.message_embeddings import (
+    STORE_DIR as MESSAGE_EMBEDDINGS_DIR,
+    load_message_vectors,
+)
+from services.embedding import get_embedding_cache, get_embeddings
+from services.ollama_client import get_llm_cache
+from services.background_processor import get_background_processor
 from services.data_processing import analyze_branches
+from services.message_store import load_chat_messages, load_messages
 from utils import load_visualization_data
 from config import CLAUDE_DATA_DIR, CHATGPT_DATA_DIR, BASE_DATA_DIR
 from services.topic_generation import generate_topic_for_cluster
 from shared_data import models_data
 
 api_bp = Blueprint("api", __name__)
-background_processor = BackgroundProcessor()
+
+# Files whose mtime and size identify each response for conditional GETs. The
+# states dir covers legacy messages_*.json files.
+VISUALIZATION_FILES = [
+    "embeddings_2d.json",
+    "clusters.json",
+    "topics.json",
+    "chat_titles.json",
+    "chats_with_reflections.json",
+]
+MESSAGE_FILES = [os.path.join("states", "messages", "manifest.json"), "states"]
 
 
 @api_bp.route("/process", methods=["POST"])
@@ -37,7 +70,7 @@ def process_data():
         file.save(file_path)
 
         # Start background processing
-        task_id = background_processor.start_task(str(file_path))
+        task_id = get_background_processor().start_task(str(file_path))
 
         return jsonify({"task_id": task_id, "message": "Processing started"}), 202
 
@@ -47,7 +80,7 @@ def process_data():
 
 @api_bp.route("/process/status/<task_id>", methods=["GET"])
 def check_task_status(task_id):
-    status = background_processor.get_task_status(task_id)
+    status = get_background_processor().get_task_status(task_id)
     if status:
         return jsonify(
             {
@@ -72,32 +105,22 @@ def get_reflections():
         if not current_context:
             return jsonify({"reflections": []})
 
-        # Generate embedding for current context
-
-        context_embedding = np.array(get_embeddings([current_context])[0]).flatten()
-
-        # Load reflections and embeddings
-        reflections_file = os.path.join(data_dir, "reflections.json")
-        if not os.path.exists(reflections_file):
+        # Load the reflection index, reloaded whenever the file changes
+        index = get_artifact_cache().get(
+            data_dir, "reflections.json", loader=load_reflection_index
+        )
+        if index is None or not index["reflections"]:
             return jsonify({"reflections": []})
 
-        with open(reflections_file, "r") as f:
-            reflections_data = json.load(f)
-
-        # Compute similarity scores
-        similarities = []
-        for cluster_id, data in reflections_data.items():
-            reflection_embedding = data["embedding"]
-            similarity = np.dot(context_embedding, reflection_embedding) / (
-                np.linalg.norm(context_embedding) * np.linalg.norm(reflection_embedding)
-            )
-            similarities.append((similarity, data["reflection"]))
+        # Embed the context, reusing recent contexts
+        context_embedding = embed_context(current_context)
+        if context_embedding is None:
+            return jsonify({"reflections": []})
 
-        # Sort and filter reflections
-        similarities.sort(reverse=True)
-        top_reflections = [ref for sim, ref in similarities[:3] if sim > 0.5]
+        # Score every reflection with one matrix-vector product
+        reflections = top_reflections(index, context_embedding)
 
-        return jsonify({"reflections": top_reflections})
+        return jsonify({"reflections": reflections})
 
     except Exception as e:
         print(f"Error retrieving reflections: {str(e)}")
@@ -110,9 +133,14 @@ def get_topics():
         chat_type = request.args.get("type", "claude")
         data_dir = CLAUDE_DATA_DIR if chat_type == "claude" else CHATGPT_DATA_DIR
 
-        with open(os.path.join(data_dir, "topics.json"), "r") as f:
-            topics = json.load(f)
-        return jsonify(topics)
+        etag = artifact_etag(data_dir, ["topics.json"])
+        if is_not_modified(etag):
+            return not_modified(etag)
+
+        topics = get_artifact_cache().get(data_dir, "topics.json")
+        if topics is None:
+            raise FileNotFoundError(os.path.join(data_dir, "topics.json"))
+        return tag_response(jsonify(topics), etag)
     except Exception as e:
         print(f"Error getting topics: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -133,24 +161,42 @@ def embeddings():
     return jsonify({"embeddings": embeddings}), 200
 
 
+@api_bp.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(
+        {
+            "llm": get_llm_cache().stats(),
+            "embeddings": get_embedding_cache().stats(),
+            "artifacts": get_artifact_cache().stats(),
+        }
+    ), 200
+
+
 @api_bp.route("/visualization", methods=["GET"])
 def get_visualization_data():
     chat_type = request.args.get("type", "claude")  # Default to claude if not specified
     data_dir = CLAUDE_DATA_DIR if chat_type == "claude" else CHATGPT_DATA_DIR
 
     try:
+        etag = artifact_etag(data_dir, VISUALIZATION_FILES)
+        if is_not_modified(etag):
+            return not_modified(etag)
+
         data = load_visualization_data(data_dir)
         if not data["points"] or not data["clusters"] or not data["titles"]:
             return jsonify([]), 200
 
-        return jsonify(
-            {
-                "points": data["points"],
-                "clusters": data["clusters"],
-                "titles": data["titles"],
-                "topics": data["topics"],
-                "chats_with_reflections": data["chats_with_reflections"],
-            }
+        return tag_response(
+            jsonify(
+                {
+                    "points": data["points"],
+                    "clusters": data["clusters"],
+                    "titles": data["titles"],
+                    "topics": data["topics"],
+                    "chats_with_reflections": data["chats_with_reflections"],
+                }
+            ),
+            etag,
         )
 
     except Exception as e:
@@ -158,45 +204,135 @@ def get_visualization_data():
         return jsonify({"error": str(e)}), 500
 
 
-@api_bp.route("/content/identify-messages", methods=["POST"])
-def identify_relevant_messages():
+def points_binary_response(data_dir, binary_file, state_file=None):
+    """
+    Serve packed float32 coordinates and int32 cluster labels.
+
+    Data processed before the binary files existed is packed on the fly from
+    the JSON artifacts.
+    """
+    if state_file:
+        json_files = [state_file]
+    else:
+        json_files = ["embeddings_2d.json", "clusters.json"]
+    etag = artifact_etag(data_dir, [binary_file] + json_files)
+    if is_not_modified(etag):
+        return not_modified(etag)
+
+    cache = get_artifact_cache()
+    data = cache.get(data_dir, binary_file, loader=read_bytes)
+    if data is None:
+        if state_file:
+            state = cache.get(data_dir, state_file)
+            if state is None:
+                return jsonify({"error": "State not found"}), 404
+            points, clusters = state["points"], state["clusters"]
+        else:
+            points = cache.get(data_dir, "embeddings_2d.json")
+            clusters = cache.get(data_dir, "clusters.json")
+            if not points or not clusters:
+                return jsonify({"error": "No visualization data found"}), 404
+        data = encode_points(points, clusters)
+
+    return tag_response(Response(data, mimetype=POINTS_MIMETYPE), etag)
+
+
+@api_bp.route("/visualization/binary", methods=["GET"])
+def get_visualization_binary():
+    chat_type = request.args.get("type", "claude")
+    data_dir = CLAUDE_DATA_DIR if chat_type == "claude" else CHATGPT_DATA_DIR
+
     try:
-        chat_type = request.args.get("type", "claude")
-        data_dir = CLAUDE_DATA_DIR if chat_type == "claude" else CHATGPT_DATA_DIR
+        return points_binary_response(data_dir, "points.bin")
+    except Exception as e:
+        print(f"Error getting binary visualization data: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
-        topic_id = request.json["topicId"]
 
-        # Load necessary data
-        with open(os.path.join(data_dir, "messages.json"), "r") as f:
-            all_messages = json.load(f)
+@api_bp.route("/visualization/lod", methods=["GET"])
+def get_visualization_lod():
+    """
+    Level-of-detail view of the map for a viewport.
+
+    Query args x0, y0, x1, y1 give the viewport in map coordinates (default:
+    everything). Zoomed out, the response lists cluster blobs. Zoomed in, it
+    lists individual points. level optionally forces a grid level. Levels
+    below the finest always return blobs.
+    """
+    chat_type = request.args.get("type", "claude")
+    data_dir = CLAUDE_DATA_DIR if chat_type == "claude" else CHATGPT_DATA_DIR
+
+    try:
+        cache = get_artifact_cache()
+        index = cache.get(data_dir, SPATIAL_INDEX_FILE, loader=load_spatial_index)
+        if index is None:
+            return jsonify({"error": "No visualization data found"}), 404
+
+        viewport = None
+        if all(arg in request.args for arg in ("x0", "y0", "x1", "y1")):
+            viewport = tuple(
+                request.args.get(arg, type=float) for arg in ("x0", "y0", "x1", "y1")
+            )
+        result = query_spatial_index(
+            index, viewport, level=request.args.get("level", type=int)
+        )
 
-        with open(os.path.join(data_dir, "chat_titles.json"), "r") as f:
-            chat_titles = json.load(f)
+        topics = cache.get(data_dir, "topics.json", default={})
+        response = {
+            "mode": result["mode"],
+            "level": result["level"],
+            "points": result["xy"].tolist(),
+            "clusters": result["clusters"].tolist(),
+        }
+        if result["mode"] == "points":
+            titles = cache.get(data_dir, "chat_titles.json", default=[])
+            response["indices"] = result["indices"].tolist()
+            response["titles"] = [
+                titles[i] if i < len(titles) else None for i in response["indices"]
+            ]
+        else:
+            response["counts"] = result["counts"].tolist()
+            response["topics"] = {
+                str(cluster): topics.get(str(cluster), {}).get("topic")
+                for cluster in set(response["clusters"])
+            }
+        return jsonify(response)
 
-        with open(os.path.join(data_dir, "clusters.json"), "r") as f:
-            clusters = json.load(f)
+    except Exception as e:
+        print(f"Error getting level-of-detail data: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
-        # Get messages from the selected topic
-        topic_messages = []
-        for message in all_messages:
-            chat_index = chat_titles.index(message["chat_name"])
-            if clusters[chat_index] == int(topic_id):
-                topic_messages.append(message)
 
-        # Process messages
-        message_texts = [msg["text"] for msg in topic_messages]
-        embeddings = get_embeddings(message_texts)
+@api_bp.route("/content/identify-messages", methods=["POST"])
+def identify_relevant_messages():
+    try:
+        chat_type = request.args.get("type", "claude")
+        data_dir = CLAUDE_DATA_DIR if chat_type == "claude" else CHATGPT_DATA_DIR
 
-        # Calculate scores
-        centroid = np.mean(embeddings, axis=0)
-        similarities = cosine_similarity([centroid], embeddings)[0]
-        lengths = np.array([len(msg["text"]) for msg in topic_messages])
-        length_scores = lengths / np.max(lengths) if lengths.size > 0 else np.array([])
-        final_scores = 0.6 * similarities + 0.4 * length_scores
+        topic_id = request.json["topicId"]
 
-        # Get top messages
-        top_indices = np.argsort(final_scores)[-20:][::-1]
-        top_messages = [topic_messages[i] for i in top_indices]
+        # Rankings are computed once at processing time
+        rankings = get_artifact_cache().get(data_dir, TOPIC_MESSAGES_FILE)
+        if rankings is None:
+            return jsonify({"error": "No topic message rankings found"}), 404
+
+        topic = rankings.get(str(int(topic_id)))
+        top_messages = topic["messages"] if topic else []
+
+        # Optionally order them by relevance to the current context, using
+        # the stored message vectors mapped read-only
+        context = request.json.get("context", "")
+        if context and top_messages:
+            vectors = get_artifact_cache().get(
+                data_dir,
+                os.path.join(MESSAGE_EMBEDDINGS_DIR, "index.jsonl"),
+                loader=load_message_vectors,
+            )
+            context_embedding = embed_context(context) if vectors else None
+            if context_embedding is not None:
+                top_messages = rerank_by_context(
+                    top_messages, vectors, context_embedding
+                )
 
         return jsonify(top_messages)
 
@@ -290,22 +426,13 @@ def get_chat_messages(chat_name):
     try:
         chat_type = request.args.get("type", "chatgpt")
         data_dir = CLAUDE_DATA_DIR if chat_type == "claude" else CHATGPT_DATA_DIR
-        states_dir = os.path.join(data_dir, "states")
-
-        # Get the latest messages file
-        message_files = [f for f in os.listdir(states_dir) if f.startswith("messages_")]
-        if not message_files:
-            return jsonify({"error": "No message data found"}), 404
 
-        latest_file = sorted(message_files)[-1]
-        messages_path = os.path.join(states_dir, latest_file)
-
-        print(f"Loading messages from: {messages_path}")
-        with open(messages_path, "r") as f:
-            all_messages = json.load(f)
+        etag = artifact_etag(data_dir, MESSAGE_FILES)
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         # Parse chat_name to extract base name and branch_id
-        match = re.match(r"^(.*) \(Branch (\d+)\)$", chat_name)
+        match = re.match(r"^(.*) \(Branch ([\d.]+)\)$", chat_name)
         if match:
             base_chat_name = match.group(1)
             branch_id = match.group(2)
@@ -313,21 +440,15 @@ def get_chat_messages(chat_name):
             base_chat_name = chat_name
             branch_id = "0"  # Default branch ID if none is specified
 
-        # Filter messages based on base_chat_name and branch_id
-        chat_messages = [
-            msg
-            for msg in all_messages
-            if msg.get("chat_name") == base_chat_name
-            and msg.get("branch_id", "0") == branch_id
-        ]
+        # Read just this branch from the message index, already sorted
+        chat_messages = load_chat_messages(data_dir, base_chat_name, branch_id)
+        if chat_messages is None:
+            return jsonify({"error": "No message data found"}), 404
 
         if not chat_messages:
             return jsonify({"error": f"No messages found for chat: {chat_name}"}), 404
 
-        # Sort messages by timestamp
-        chat_messages.sort(key=lambda x: pd.to_datetime(x.get("timestamp", "0")))
-
-        return jsonify({"messages": chat_messages})
+        return tag_response(jsonify({"messages": chat_messages}), etag)
 
     except Exception as e:
         print(f"Error retrieving messages: {str(e)}")
@@ -340,31 +461,22 @@ def get_all_chat_messages(chat_name):
     try:
         chat_type = request.args.get("type", "chatgpt")
         data_dir = CLAUDE_DATA_DIR if chat_type == "claude" else CHATGPT_DATA_DIR
-        states_dir = os.path.join(data_dir, "states")
 
-        # Get latest messages file
-        message_files = [f for f in os.listdir(states_dir) if f.startswith("messages_")]
-        if not message_files:
-            return jsonify({"error": "No message data found"}), 404
-
-        latest_file = sorted(message_files)[-1]
-        messages_path = os.path.join(states_dir, latest_file)
-
-        print(f"Loading messages from: {messages_path}")
-        with open(messages_path, "r") as f:
-            all_messages = json.load(f)
+        etag = artifact_etag(data_dir, MESSAGE_FILES)
+        if is_not_modified(etag):
+            return not_modified(etag)
 
         # **Parse chat_name to extract base name**
-        match = re.match(r"^(.*) \(Branch \d+\)$", chat_name)
+        match = re.match(r"^(.*) \(Branch [\d.]+\)$", chat_name)
         if match:
             base_chat_name = match.group(1)
         else:
             base_chat_name = chat_name
 
-        # **Filter messages for the base chat name**
-        chat_messages = [
-            msg for msg in all_messages if msg.get("chat_name") == base_chat_name
-        ]
+        # **Read every branch of the base chat from the message index**
+        chat_messages = load_chat_messages(data_dir, base_chat_name)
+        if chat_messages is None:
+            return jsonify({"error": "No message data found"}), 404
 
         if not chat_messages:
             return jsonify({"error": f"No messages found for chat: {chat_name}"}), 404
@@ -377,11 +489,7 @@ def get_all_chat_messages(chat_name):
             branch_id = msg.get("branch_id", "0")
             branches[branch_id].append(msg)
 
-        # Sort messages within each branch
-        for branch_msgs in branches.values():
-            branch_msgs.sort(key=lambda x: pd.to_datetime(x.get("timestamp", "0")))
-
-        return jsonify({"branches": branches})
+        return tag_response(jsonify({"branches": branches}), etag)
 
     except Exception as e:
         print(f"Error retrieving messages: {str(e)}")
@@ -396,19 +504,15 @@ def get_branched_messages():
 
         chat_type = request.args.get("type", "chatgpt")
         data_dir = CLAUDE_DATA_DIR if chat_type == "claude" else CHATGPT_DATA_DIR
-        states_dir = os.path.join(data_dir, "states")
 
-        # Load latest messages
-        message_files = [f for f in os.listdir(states_dir) if f.startswith("messages_")]
-        if not message_files:
-            return jsonify({"error": "No message data found"}), 404
+        etag = artifact_etag(data_dir, MESSAGE_FILES)
+        if is_not_modified(etag):
+            return not_modified(etag)
 
-        latest_file = sorted(message_files)[-1]
-        messages_path = os.path.join(states_dir, latest_file)
-
-        print(f"\nLoading messages from: {messages_path}")
-        with open(messages_path, "r") as f:
-            all_messages = json.load(f)
+        # Load the messages as of the latest month
+        all_messages = load_messages(data_dir)
+        if all_messages is None:
+            return jsonify({"error": "No message data found"}), 404
 
         print(f"\nAnalyzing {len(all_messages)} messages for branches")
 
@@ -509,7 +613,7 @@ def get_branched_messages():
             f"Total messages processed: {response_data['stats']['total_messages_processed']}"
         )
 
-        return jsonify(response_data)
+        return tag_response(jsonify(response_data), etag)
 
     except Exception as e:
         error_msg = f"Error processing branched messages: {str(e)}"
@@ -551,12 +655,31 @@ def get_state(month_year):
         chat_type = request.args.get("type", "claude")
         data_dir = CLAUDE_DATA_DIR if chat_type == "claude" else CHATGPT_DATA_DIR
 
-        state_file = os.path.join(data_dir, "states", f"state_{month_year}.json")
-        if not os.path.exists(state_file):
+        state_file = os.path.join("states", f"state_{month_year}.json")
+        etag = artifact_etag(data_dir, [state_file])
+        if is_not_modified(etag):
+            return not_modified(etag)
+
+        state = get_artifact_cache().get(data_dir, state_file)
+        if state is None:
             return jsonify({"error": "State not found"}), 404
 
-        with open(state_file, "r") as f:
-            return jsonify(json.load(f))
+        return tag_response(jsonify(state), etag)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api_bp.route("/state/<month_year>/binary", methods=["GET"])
+def get_state_binary(month_year):
+    try:
+        chat_type = request.args.get("type", "claude")
+        data_dir = CLAUDE_DATA_DIR if chat_type == "claude" else CHATGPT_DATA_DIR
+
+        return points_binary_response(
+            data_dir,
+            os.path.join("states", f"points_{month_year}.bin"),
+            os.path.join("states", f"state_{month_year}.json"),
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
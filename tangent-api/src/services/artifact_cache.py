@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+from config import ARTIFACT_CACHE_MAX_BYTES
+
+
+def load_json_file(path: str) -> Any:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class ArtifactCache:
+    """
+    In-memory read-through cache of processed artifacts.
+
+    Entries are keyed by (data_dir, file name). An entry is reused while the
+    file's mtime and size and the data dir's generation are unchanged.
+    Processed files are written to a temp file and swapped in with
+    os.replace, so a read never sees a partly written file. The background
+    processor bumps the generation once it has written a whole state, which
+    drops entries that an mtime or size check alone could miss. Files of one
+    state are replaced one by one, so a request that reads several of them
+    mid-update can still mix two states. Least recently used entries are
+    dropped once the total size of the cached files passes ``max_bytes``.
+
+    Cached values are shared between requests and must not be mutated.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Tuple[str, str], Tuple]" = OrderedDict()
+        self.generations: Dict[str, int] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, data_dir: str) -> int:
+        return self.generations.get(os.path.abspath(data_dir), 0)
+
+    def bump_generation(self, data_dir: str):
+        """Invalidate every cached artifact under ``data_dir``"""
+        data_dir = os.path.abspath(data_dir)
+        with self.lock:
+            self.generations[data_dir] = self.generations.get(data_dir, 0) + 1
+
+    def get(
+        self,
+        data_dir: str,
+        file_name: str,
+        loader: Callable[[str], Any] = load_json_file,
+        default: Any = None,
+    ) -> Any:
+        """Return the loaded artifact, or ``default`` if the file does not exist"""
+        data_dir = os.path.abspath(data_dir)
+        path = os.path.join(data_dir, file_name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return default
+
+        key = (data_dir, file_name)
+        version = (stat.st_mtime_ns, stat.st_size, self.generations.get(data_dir, 0))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Parse outside the lock so one large file does not block other readers
+        value = loader(path)
+
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[2]
+            if stat.st_size <= self.max_bytes:
+                self.entries[key] = (version, value, stat.st_size)
+                self.total_bytes += stat.st_size
+                self._evict()
+        return value
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            _, (_, _, size) = self.entries.popitem(last=False)
+            self.total_bytes -= size
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_artifact_cache = None
+_artifact_cache_lock = threading.Lock()
+
+
+def get_artifact_cache() -> ArtifactCache:
+    """Return the process-wide artifact cache"""
+    global _artifact_cache
+    with _artifact_cache_lock:
+        if _artifact_cache is None:
+            _artifact_cache = ArtifactCache(ARTIFACT_CACHE_MAX_BYTES)
+        return _artifact_cache
@@ -1,15 +1,21 @@
 import queue
 import threading
 import time
-import json
-import os
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional
 
-import pandas as pd
 from models import ProcessingTask
 import traceback
-from config import CHATGPT_DATA_DIR, CLAUDE_DATA_DIR
-from services.data_processing import process_chatgpt_messages, process_claude_messages, save_state, save_latest_state, process_data_by_month
+from services.artifact_cache import get_artifact_cache
+from services.data_processing import (
+    prepare_messages_frame,
+    process_data_by_month,
+    save_latest_state,
+    save_state,
+)
+from services.ingestion import detect_chat_type, read_messages_frame
+from services.message_store import MessageStore
+from services.reflection_stage import update_reflections
+from services.topic_rankings import update_topic_rankings
 
 
 class BackgroundProcessor:
@@ -50,24 +56,20 @@ class BackgroundProcessor:
 
                 task.status = "processing"
                 try:
-                    # Load and process the data based on chat type
-                    with open(task.file_path, "r") as f:
-                        data = json.load(f)
-
-                    # Process messages based on chat type
-                    messages = (
-                        process_chatgpt_messages(data)
-                        if task.chat_type == "chatgpt"
-                        else process_claude_messages(data)
+                    # Stream the export into a columnar DataFrame and
+                    # process it month by month
+                    df = prepare_messages_frame(
+                        read_messages_frame(task.file_path, task.chat_type)
                     )
 
-                    # Create DataFrame and process month by month
-                    df = pd.DataFrame(messages)
-                    df["month_year"] = df["timestamp"].dt.strftime("%Y-%m")
-
                     total_months = len(df["month_year"].unique())
                     current_month = 0
 
+                    message_store = MessageStore(task.data_dir)
+                    message_store.begin()
+                    messages_start = 0
+                    latest_update = None
+
                     for update in process_data_by_month(df):
                         current_month += 1
                         task.progress = (current_month / total_months) * 100
@@ -75,26 +77,48 @@ class BackgroundProcessor:
                         # Save state and files
                         save_state(update, update["month_year"], task.data_dir)
 
-                        # Save monthly messages
-                        month_messages = df[df["month_year"] <= update["month_year"]]
-                        messages_json = month_messages.to_json(
-                            orient="records", date_format="iso"
+                        # Append only the messages new since the last update
+                        messages_end = update["messages_end"]
+                        message_store.append_segment(
+                            update["month_year"], df.iloc[messages_start:messages_end]
                         )
-
-                        # Save to appropriate directory
-                        states_dir = os.path.join(task.data_dir, "states")
-                        os.makedirs(states_dir, exist_ok=True)
-
-                        with open(
-                            os.path.join(
-                                states_dir, f'messages_{update["month_year"]}.json'
-                            ),
-                            "w",
-                        ) as f:
-                            f.write(messages_json)
+                        messages_start = messages_end
 
                         # Update latest state files
                         save_latest_state(update, task.data_dir)
+                        latest_update = update
+
+                        # Make readers drop artifacts cached before this month
+                        get_artifact_cache().bump_generation(task.data_dir)
+
+                    # With no months processed, keep the last run's messages
+                    # published instead of an empty store
+                    if latest_update is not None:
+                        message_store.finish()
+
+                        # Reflect on the final state, only for clusters whose
+                        # struggle messages changed since the last run
+                        try:
+                            update_reflections(
+                                df.iloc[: latest_update["messages_end"]],
+                                latest_update,
+                                task.data_dir,
+                            )
+                        except Exception as e:
+                            print(f"Error generating reflections: {str(e)}")
+                            traceback.print_exc()
+
+                        # Rank each topic's messages for identify-messages
+                        try:
+                            update_topic_rankings(
+                                df.iloc[: latest_update["messages_end"]],
+                                latest_update,
+                                task.data_dir,
+                            )
+                        except Exception as e:
+                            print(f"Error ranking topic messages: {str(e)}")
+                            traceback.print_exc()
+                    get_artifact_cache().bump_generation(task.data_dir)
 
                     task.completed = True
                     task.status = "completed"
@@ -113,29 +137,20 @@ class BackgroundProcessor:
             finally:
                 self.task_queue.task_done()
 
-def detect_chat_type(file_path: str) -> Tuple[str, str]:
-    """
-    Detect whether the file contains Claude or ChatGPT chats and return the appropriate data directory
-    """
-    try:
-        with open(file_path, "r") as f:
-            data = json.load(f)
-
-        # Check first item in the data
-        if isinstance(data, list):
-            first_item = data[0] if data else {}
 
-            # ChatGPT format detection (has 'mapping' field)
-            if isinstance(first_item, dict) and "mapping" in first_item:
-                os.makedirs(CHATGPT_DATA_DIR, exist_ok=True)
-                return "chatgpt", CHATGPT_DATA_DIR
+_processor: Optional[BackgroundProcessor] = None
+_processor_lock = threading.Lock()
 
-            # Claude format detection (has 'chat_messages' field)
-            elif isinstance(first_item, dict) and "chat_messages" in first_item:
-                os.makedirs(CLAUDE_DATA_DIR, exist_ok=True)
-                return "claude", CLAUDE_DATA_DIR
 
-        raise ValueError("Unknown chat format")
+def get_background_processor() -> BackgroundProcessor:
+    """
+    Return the process-wide processor, starting its thread on first use.
 
-    except Exception as e:
-        raise Exception(f"Error detecting chat type: {str(e)}")
+    Nothing is started at import time, so spawned worker processes that
+    re-import the API modules don't each start an idle processing thread.
+    """
+    global _processor
+    with _processor_lock:
+        if _processor is None:
+            _processor = BackgroundProcessor()
+        return _processor
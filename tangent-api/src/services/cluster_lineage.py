@@ -0,0 +1,95 @@
+from collections import Counter
+from typing import Dict
+
+from config import LINEAGE_MIN_OVERLAP
+from services.topic_generation import is_usable_topic
+
+
+class ClusterLineage:
+    """
+    Tracks cluster identities across consecutive monthly states.
+
+    Each month's clusters are matched one-to-one against the previous month's
+    by membership overlap (Jaccard similarity of their titles). A cluster that
+    overlaps an earlier one by at least ``min_overlap`` keeps its lineage id
+    and topic label. Only new or substantially changed clusters are sent for
+    labelling. Reflections are not carried: they are generated once for the
+    final state, reusing earlier ones whose struggle messages are unchanged.
+    """
+
+    def __init__(self, min_overlap: float = LINEAGE_MIN_OVERLAP):
+        self.min_overlap = min_overlap
+        self.lineage_of_title: Dict[str, int] = {}
+        self.sizes: Dict[int, int] = {}
+        self.metadata: Dict[int, dict] = {}
+        self.next_lineage_id = 0
+
+    def match(self, clusters, chat_titles) -> Dict[int, int]:
+        """Map current cluster ids to the lineage ids they carry over"""
+        if not self.metadata:
+            return {}
+
+        cluster_sizes = Counter(int(cluster_id) for cluster_id in clusters)
+        overlaps = Counter(
+            (int(cluster_id), self.lineage_of_title[title])
+            for title, cluster_id in zip(chat_titles, clusters)
+            if title in self.lineage_of_title
+        )
+
+        candidates = []
+        for (cluster_id, lineage_id), shared in overlaps.items():
+            union = cluster_sizes[cluster_id] + self.sizes[lineage_id] - shared
+            overlap = shared / union
+            if overlap >= self.min_overlap:
+                candidates.append((overlap, cluster_id, lineage_id))
+
+        # Greedy one-to-one assignment, best overlaps first
+        matches = {}
+        claimed = set()
+        for overlap, cluster_id, lineage_id in sorted(candidates, reverse=True):
+            if cluster_id in matches or lineage_id in claimed:
+                continue
+            matches[cluster_id] = lineage_id
+            claimed.add(lineage_id)
+        return matches
+
+    def carried_metadata(self, matches: Dict[int, int]) -> Dict[int, dict]:
+        """
+        Previous metadata for each carried-over cluster id.
+
+        Clusters whose earlier label failed are left out, so they are
+        labelled again.
+        """
+        return {
+            cluster_id: self.metadata[lineage_id]
+            for cluster_id, lineage_id in matches.items()
+            if is_usable_topic(self.metadata[lineage_id].get("topic"))
+        }
+
+    def update(self, month, clusters, chat_titles, cluster_metadata, matches):
+        """Assign lineage ids and coherence history, then remember this month"""
+        lineage_ids = {}
+        for cluster_key, metadata in cluster_metadata.items():
+            cluster_id = int(cluster_key)
+            lineage_id = matches.get(cluster_id)
+            history = []
+            if lineage_id is None:
+                lineage_id = self.next_lineage_id
+                self.next_lineage_id += 1
+            else:
+                history = list(self.metadata[lineage_id].get("coherence_history", []))
+
+            history.append({"month_year": month, "coherence": metadata["coherence"]})
+            metadata["lineage_id"] = lineage_id
+            metadata["coherence_history"] = history
+            lineage_ids[cluster_id] = lineage_id
+
+        self.lineage_of_title = {
+            title: lineage_ids[int(cluster_id)]
+            for title, cluster_id in zip(chat_titles, clusters)
+        }
+        self.sizes = Counter(self.lineage_of_title.values())
+        self.metadata = {
+            lineage_ids[int(cluster_key)]: metadata
+            for cluster_key, metadata in cluster_metadata.items()
+        }
@@ -0,0 +1,110 @@
+import numpy as np
+from scipy import sparse
+
+
+def membership_matrix(clusters, cluster_ids):
+    """One-hot (n_points x n_clusters) membership matrix and each point's column"""
+    positions = np.searchsorted(cluster_ids, clusters)
+    n_points = len(clusters)
+    membership = sparse.csr_matrix(
+        (np.ones(n_points, dtype=np.float32), (np.arange(n_points), positions)),
+        shape=(n_points, len(cluster_ids)),
+    )
+    return membership, positions
+
+
+def _best_per_group(scores, positions, n_groups):
+    """Index of the highest score within each group"""
+    order = np.lexsort((-scores, positions))
+    firsts = np.searchsorted(positions[order], np.arange(n_groups))
+    return order[firsts]
+
+
+def compute_cluster_stats(clusters, normalized_embeddings, distance_matrix=None):
+    """
+    Compute per-cluster statistics with a few matrix operations.
+
+    Returns a dict keyed by cluster id with the cluster's size, coherence
+    (mean pairwise cosine similarity), centroid (mean of the normalized
+    member embeddings), radius (largest cosine distance from a member to the
+    centroid) and medoid (index of the member closest to all others).
+
+    Coherence and medoids come from ``distance_matrix`` when it is given,
+    otherwise from the normalized embeddings, where the sum of similarities
+    from a point to a cluster is its dot product with the cluster's sum.
+    """
+    clusters = np.asarray(clusters)
+    n_points = len(clusters)
+    cluster_ids = np.unique(clusters)
+    n_clusters = len(cluster_ids)
+
+    membership, positions = membership_matrix(clusters, cluster_ids)
+    counts = np.bincount(positions, minlength=n_clusters)
+    pair_counts = counts * (counts - 1)
+
+    sums = np.asarray(membership.T @ normalized_embeddings, dtype=np.float64)
+    centroids = sums / counts[:, None]
+
+    centroid_norms = np.linalg.norm(centroids, axis=1)
+    centroid_norms[centroid_norms == 0] = 1.0
+    unit_centroids = centroids / centroid_norms[:, None]
+    own_centroid_similarity = np.einsum(
+        "ij,ij->i", normalized_embeddings, unit_centroids[positions]
+    )
+    radius = np.zeros(n_clusters)
+    np.maximum.at(radius, positions, 1 - own_centroid_similarity)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if distance_matrix is None:
+            own_similarity = np.einsum(
+                "ij,ij->i", normalized_embeddings, sums[positions]
+            )
+            intra_similarity = np.einsum("ij,ij->i", sums, sums) - counts
+            coherence = intra_similarity / pair_counts
+            medoid_scores = own_similarity
+        else:
+            distance_sums = np.asarray(membership.T @ distance_matrix).T
+            own_distance = distance_sums[np.arange(n_points), positions]
+            intra_distance = np.bincount(
+                positions, weights=own_distance, minlength=n_clusters
+            )
+            coherence = 1 - intra_distance / pair_counts
+            medoid_scores = -own_distance
+
+    coherence[counts < 2] = 1.0
+    medoids = _best_per_group(medoid_scores, positions, n_clusters)
+
+    return {
+        cluster_id: {
+            "size": int(counts[i]),
+            "coherence": float(coherence[i]),
+            "centroid": centroids[i].astype(np.float32),
+            "radius": float(radius[i]),
+            "medoid": int(medoids[i]),
+        }
+        for i, cluster_id in enumerate(cluster_ids.tolist())
+    }
+
+
+def nearest_clusters(
+    clusters, point_indices, normalized_embeddings=None, distance_matrix=None
+):
+    """
+    Return the cluster with the lowest mean cosine distance for each point.
+
+    Only points that are not outliers (-1) count as cluster members.
+    """
+    clusters = np.asarray(clusters)
+    valid_indices = np.where(clusters != -1)[0]
+    cluster_ids = np.unique(clusters[valid_indices])
+    membership, positions = membership_matrix(clusters[valid_indices], cluster_ids)
+    counts = np.bincount(positions, minlength=len(cluster_ids))
+
+    if distance_matrix is None:
+        means = (membership.T @ normalized_embeddings[valid_indices]) / counts[:, None]
+        scores = normalized_embeddings[point_indices] @ np.asarray(means).T
+    else:
+        rows = distance_matrix[point_indices][:, valid_indices]
+        scores = -np.asarray(membership.T @ rows.T).T / counts
+
+    return cluster_ids[np.argmax(scores, axis=1)]
@@ -2,9 +2,31 @@ import os
 import hdbscan
 from scipy.spatial.distance import pdist, squareform
 import numpy as np
-from services.topic_generation import generate_topic_for_cluster
+from config import CLUSTERING_MODE, CLUSTERING_SPARSE_THRESHOLD
+from services.cluster_stats import nearest_clusters
+from services.topic_generation import generate_topics_for_clusters
 from sklearn.base import defaultdict
 
+# Cosine distance threshold used when selecting clusters
+CLUSTER_SELECTION_EPSILON = 0.3
+
+
+def use_sparse_clustering(n_points):
+    """Decide whether to cluster normalized embeddings instead of a dense matrix"""
+    if CLUSTERING_MODE == "sparse":
+        return True
+    if CLUSTERING_MODE == "dense":
+        return False
+    return n_points > CLUSTERING_SPARSE_THRESHOLD
+
+
+def normalize_embeddings(embeddings):
+    """L2-normalize embeddings so euclidean geometry matches cosine distance"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
 
 def perform_clustering(distance_matrix, n_points):
     """Perform clustering with proper error handling"""
@@ -14,7 +36,7 @@ def perform_clustering(distance_matrix, n_points):
             min_cluster_size=min_cluster_size,
             min_samples=1,
             metric="precomputed",
-            cluster_selection_epsilon=0.3,
+            cluster_selection_epsilon=CLUSTER_SELECTION_EPSILON,
             cluster_selection_method="leaf",
             prediction_data=False,
         )
@@ -24,7 +46,41 @@ def perform_clustering(distance_matrix, n_points):
         # Handle outliers
         outlier_mask = clusters == -1
         if np.any(outlier_mask):
-            clusters = handle_outliers(clusters, distance_matrix)
+            clusters = handle_outliers(clusters, distance_matrix=distance_matrix)
+
+        return clusters
+
+    except Exception as e:
+        raise Exception(f"Clustering failed: {str(e)}")
+
+
+def perform_embedding_clustering(normalized_embeddings):
+    """
+    Cluster L2-normalized embeddings without building a distance matrix.
+
+    For unit vectors the euclidean distance is sqrt(2 * cosine distance), so
+    the cosine selection epsilon is converted and HDBSCAN can use its tree
+    based algorithms, whose memory grows linearly with the number of points.
+    """
+    try:
+        n_points = len(normalized_embeddings)
+        min_cluster_size = min(2, n_points - 1)
+        clusterer = hdbscan.HDBSCAN(
+            min_cluster_size=min_cluster_size,
+            min_samples=1,
+            metric="euclidean",
+            cluster_selection_epsilon=float(np.sqrt(2 * CLUSTER_SELECTION_EPSILON)),
+            cluster_selection_method="leaf",
+            prediction_data=False,
+        )
+
+        clusters = clusterer.fit_predict(normalized_embeddings)
+
+        outlier_mask = clusters == -1
+        if np.any(outlier_mask):
+            clusters = handle_outliers(
+                clusters, normalized_embeddings=normalized_embeddings
+            )
 
         return clusters
 
@@ -35,61 +91,62 @@ def perform_clustering(distance_matrix, n_points):
 GENERATION_MODEL = os.getenv("GENERATION_MODEL", "qwen2.5-coder:7b")
 
 
-def generate_cluster_metadata(clusters, chat_titles, distance_matrix):
-    """Generate metadata for each cluster including topics and coherence scores"""
+def generate_cluster_metadata(clusters, chat_titles, cluster_stats, carried=None):
+    """
+    Generate metadata for each cluster including topics and coherence scores.
+
+    Clusters in ``carried`` (cluster id -> previous metadata) keep their
+    earlier topic label; only the rest are sent to the LLM. Reflections are
+    left empty here. The reflection stage fills them in for the latest state.
+    """
+    carried = carried or {}
+
     # Group titles by cluster
     cluster_titles = defaultdict(list)
     for title, cluster_id in zip(chat_titles, clusters):
         cluster_titles[cluster_id].append(title)
 
+    # Generate topic labels for new or changed clusters concurrently
+    topics = generate_topics_for_clusters(
+        {
+            cluster_id: titles
+            for cluster_id, titles in cluster_titles.items()
+            if cluster_id not in carried
+        }
+    )
+
     # Generate metadata for each cluster
     cluster_metadata = {}
     for cluster_id, titles in cluster_titles.items():
-        # Generate topic label for cluster
-        topic = generate_topic_for_cluster(titles)
-
-        # Calculate coherence score based on pairwise distances
-        cluster_indices = np.where(clusters == cluster_id)[0]
-        coherence = 1.0  # Default for single-point clusters
-
-        if len(cluster_indices) > 1:
-            # Calculate average pairwise similarity within cluster
-            cluster_distances = distance_matrix[cluster_indices][:, cluster_indices]
-            coherence = np.mean(
-                [
-                    1 - cluster_distances[i, j]
-                    for i in range(len(cluster_indices))
-                    for j in range(i + 1, len(cluster_indices))
-                ]
-            )
+        stats = cluster_stats[cluster_id]
+        previous = carried.get(cluster_id)
 
         cluster_metadata[str(cluster_id)] = {
-            "topic": topic,
+            "topic": previous["topic"] if previous else topics[cluster_id],
             "size": len(titles),
-            "coherence": float(coherence),  # Ensure coherence is JSON serializable
-            "reflection": "",  # Initialize empty reflection that can be populated later
+            "coherence": stats["coherence"],
+            "radius": stats["radius"],
+            "medoid": chat_titles[stats["medoid"]],
+            # Reflection starts empty and is populated after processing
+            "reflection": "",
         }
 
     return cluster_metadata
 
 
-def handle_outliers(clusters, distance_matrix):
-    """Handle outlier points in clustering"""
+def handle_outliers(clusters, distance_matrix=None, normalized_embeddings=None):
+    """Assign outlier points to the cluster with the lowest mean distance"""
     outlier_indices = np.where(clusters == -1)[0]
-    valid_clusters = np.unique(clusters[clusters != -1])
-
-    for idx in outlier_indices:
-        if len(valid_clusters) > 0:
-            distances_to_clusters = {}
-            for valid_cluster in valid_clusters:
-                cluster_points = clusters == valid_cluster
-                avg_distance = np.mean(distance_matrix[idx, cluster_points])
-                distances_to_clusters[valid_cluster] = avg_distance
-
-            nearest_cluster = min(distances_to_clusters.items(), key=lambda x: x[1])[0]
-            clusters[idx] = nearest_cluster
-        else:
-            new_cluster = max(clusters) + 1 if len(clusters) > 0 else 0
-            clusters[idx] = new_cluster
 
+    if np.all(clusters == -1):
+        # No clusters to join, give every outlier its own cluster
+        clusters[outlier_indices] = np.arange(len(outlier_indices))
+        return clusters
+
+    clusters[outlier_indices] = nearest_clusters(
+        clusters,
+        outlier_indices,
+        normalized_embeddings=normalized_embeddings,
+        distance_matrix=distance_matrix,
+    )
     return clusters
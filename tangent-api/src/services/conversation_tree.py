@@ -0,0 +1,61 @@
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+def build_children_index(
+    node_ids: List[str], parent_of: Dict[str, Optional[str]]
+) -> Dict[str, List[str]]:
+    """Index parent -> children once, keeping children in input order"""
+    children_of = defaultdict(list)
+    for node_id in node_ids:
+        parent_id = parent_of.get(node_id)
+        if parent_id:
+            children_of[parent_id].append(node_id)
+    return children_of
+
+
+def walk_branches(
+    node_ids: List[str],
+    parent_of: Dict[str, Optional[str]],
+    children_of: Optional[Dict[str, List[str]]] = None,
+) -> Iterator[Tuple[str, str, bool]]:
+    """
+    Walk a conversation tree and yield (node_id, branch_id, is_branch_point).
+
+    Nodes whose parent is missing or unknown are roots on branch "0". A node
+    with several children is a branch point, and its i-th child starts branch
+    "<branch>.<i>". A single child stays on its parent's branch. The walk is
+    iterative and depth-first and visits each node once, so it is O(n) and
+    safe for very long chats.
+    """
+    if children_of is None:
+        children_of = build_children_index(node_ids, parent_of)
+
+    known = set(node_ids)
+    roots = [
+        node_id
+        for node_id in node_ids
+        if not parent_of.get(node_id) or parent_of[node_id] not in known
+    ]
+
+    visited = set()
+    for root in roots:
+        stack = [(root, "0")]
+        while stack:
+            node_id, branch_id = stack.pop()
+            if node_id in visited:
+                continue
+            visited.add(node_id)
+
+            children = [
+                child for child in children_of.get(node_id, []) if child in known
+            ]
+            is_branch_point = len(children) > 1
+            yield node_id, branch_id, is_branch_point
+
+            # Push in reverse so children are visited in their original order
+            if is_branch_point:
+                for idx in range(len(children) - 1, -1, -1):
+                    stack.append((children[idx], f"{branch_id}.{idx}"))
+            elif children:
+                stack.append((children[0], branch_id))
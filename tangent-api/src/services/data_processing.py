@@ -1,16 +1,23 @@
-import json
 import os
 import traceback
-import numpy as np
 import pandas as pd
 from collections import defaultdict 
-from scipy.spatial.distance import pdist, squareform  # Move import here to be explicit
-import umap
-from config import CLAUDE_DATA_DIR, CHATGPT_DATA_DIR
-from typing import List, Tuple
-from services.embedding import get_embeddings
-from scipy.spatial.distance import squareform
-from services.clustering import perform_clustering, generate_cluster_metadata
+from config import (
+    PROCESSING_WORKERS,
+    PROJECTION_MODE,
+)
+from typing import Dict, List, Tuple
+from services.embedding import get_embeddings_array
+from services.cluster_lineage import ClusterLineage
+from services.clustering import generate_cluster_metadata
+from services.conversation_tree import walk_branches
+from services.month_layout import compute_month_layout
+from services.parallel_processing import process_months_parallel
+from services.points_binary import write_points_file
+from services.spatial_index import save_spatial_index
+from services.struggle_detection import get_struggle_detector
+from services.projection import IncrementalProjector
+from utils import write_json_atomic
 
 
 def save_state(state_data, month_year, data_dir):
@@ -18,306 +25,348 @@ def save_state(state_data, month_year, data_dir):
     state_dir = os.path.join(data_dir, "states")
     os.makedirs(state_dir, exist_ok=True)
 
-    state_file = os.path.join(state_dir, f"state_{month_year}.json")
-    with open(state_file, "w") as f:
-        json.dump(
-            {
-                "month_year": month_year,
-                "points": state_data["points"],
-                "clusters": state_data["clusters"],
-                "titles": state_data["titles"],
-                "topics": state_data["topics"],
-                "total_conversations": state_data["total_conversations"],
-            },
-            f,
-        )
+    write_json_atomic(
+        os.path.join(state_dir, f"state_{month_year}.json"),
+        {
+            "month_year": month_year,
+            "points": state_data["points"],
+            "clusters": state_data["clusters"],
+            "titles": state_data["titles"],
+            "topics": state_data["topics"],
+            "total_conversations": state_data["total_conversations"],
+        },
+    )
+    write_points_file(
+        os.path.join(state_dir, f"points_{month_year}.bin"),
+        state_data["points"],
+        state_data["clusters"],
+    )
 
 
 def save_latest_state(update, data_dir):
     """Save the latest state files to the appropriate directory"""
-    with open(os.path.join(data_dir, "embeddings_2d.json"), "w") as f:
-        json.dump(update["points"], f)
-    with open(os.path.join(data_dir, "clusters.json"), "w") as f:
-        json.dump(update["clusters"], f)
-    with open(os.path.join(data_dir, "topics.json"), "w") as f:
-        json.dump(update["topics"], f)
-    with open(os.path.join(data_dir, "chat_titles.json"), "w") as f:
-        json.dump(update["titles"], f)
+    write_points_file(
+        os.path.join(data_dir, "points.bin"), update["points"], update["clusters"]
+    )
+    save_spatial_index(data_dir, update["points"], update["clusters"])
+    write_json_atomic(os.path.join(data_dir, "embeddings_2d.json"), update["points"])
+    write_json_atomic(os.path.join(data_dir, "clusters.json"), update["clusters"])
+    write_json_atomic(os.path.join(data_dir, "topics.json"), update["topics"])
+    write_json_atomic(os.path.join(data_dir, "chat_titles.json"), update["titles"])
+
+
+MESSAGE_COLUMNS = [
+    "chat_name",
+    "chat_id",
+    "message_id",
+    "parent_message_id",
+    "branch_id",
+    "sender",
+    "timestamp",
+    "text",
+    "is_branch_point",
+]
+
+# Low-cardinality string columns repeated on every row
+CATEGORICAL_COLUMNS = ["chat_name", "chat_id", "sender", "branch_id"]
+
+
+def parse_timestamps(raw_timestamps) -> pd.Series:
+    """
+    Convert raw export timestamps to UTC datetimes in vectorized calls.
 
+    Numbers are treated as Unix seconds and anything else is parsed as a date
+    string. Unparseable values become NaT.
+    """
+    raw = pd.Series(raw_timestamps, dtype=object)
+    numeric = pd.to_numeric(raw, errors="coerce")
+    timestamps = pd.to_datetime(numeric, unit="s", utc=True, errors="coerce")
+
+    string_mask = numeric.isna() & raw.notna()
+    if string_mask.any():
+        strings = raw[string_mask].astype(str)
+        parsed = pd.to_datetime(strings, utc=True, errors="coerce", format="ISO8601")
+        # Fall back to per-value parsing only for the few non-ISO strings
+        unparsed = parsed.isna()
+        if unparsed.any():
+            parsed = parsed.combine_first(
+                pd.to_datetime(
+                    strings[unparsed], utc=True, errors="coerce", format="mixed"
+                )
+            )
+        timestamps = timestamps.combine_first(parsed)
+    return timestamps
 
-def process_claude_messages(data: List[dict]) -> List[dict]:
-    messages = []
-    for chat in data:
-        chat_name = chat.get("name", "Unnamed Chat")
-        chat_id = chat.get("uuid", "")
-        chat_messages = chat.get("chat_messages", [])
-        children_by_parent = defaultdict(list)
-        messages_dict = {}
-
-        for msg in chat_messages:
-            msg_id = msg.get("uuid", "")
-            parent_id = msg.get("parent", None)
-
-            if msg_id:
-                messages_dict[msg_id] = msg
-                if parent_id:
-                    children_by_parent[parent_id].append(msg_id)
-
-        for msg_id, msg in messages_dict.items():
-            timestamp = pd.to_datetime(msg.get("created_at"))
-            if pd.isna(timestamp):
-                continue
 
-            parent_id = msg.get("parent")
-            has_multiple_children = len(children_by_parent.get(msg_id, [])) > 1
-
-            processed_msg = {
-                "chat_name": chat_name,
-                "chat_id": chat_id,
-                "message_id": msg_id,
-                "parent_message_id": parent_id,
-                "branch_id": "0",  # Will be updated during tree traversal
-                "sender": msg.get("sender", "unknown"),
-                "timestamp": timestamp,
-                "text": msg.get("text", ""),
-                "is_branch_point": has_multiple_children,
-            }
+class MessageColumns:
+    """
+    Collects message fields column by column while conversations are read.
+
+    Timestamps are kept raw until ``to_frame`` converts them in one
+    vectorized call, and repeated strings become categoricals there.
+    """
+
+    def __init__(self):
+        self.columns = {name: [] for name in MESSAGE_COLUMNS}
+
+    def __len__(self):
+        return len(self.columns["message_id"])
+
+    def append(
+        self,
+        chat_name,
+        chat_id,
+        message_id,
+        parent_message_id,
+        branch_id,
+        sender,
+        raw_timestamp,
+        text,
+        is_branch_point,
+    ):
+        columns = self.columns
+        columns["chat_name"].append(chat_name)
+        columns["chat_id"].append(chat_id)
+        columns["message_id"].append(message_id)
+        columns["parent_message_id"].append(parent_message_id)
+        columns["branch_id"].append(branch_id)
+        columns["sender"].append(sender)
+        columns["timestamp"].append(raw_timestamp)
+        columns["text"].append(text)
+        columns["is_branch_point"].append(is_branch_point)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Build the message DataFrame, dropping rows without a valid timestamp"""
+        df = pd.DataFrame(
+            {
+                name: values
+                for name, values in self.columns.items()
+                if name != "timestamp"
+            },
+            columns=MESSAGE_COLUMNS,
+        )
+        df["timestamp"] = parse_timestamps(self.columns["timestamp"])
+        df = df.dropna(subset=["timestamp"]).reset_index(drop=True)
+
+        for name in CATEGORICAL_COLUMNS:
+            df[name] = df[name].astype("category")
+        df["is_branch_point"] = df["is_branch_point"].astype(bool)
+
+        # Flag struggle messages once so later stages never rescan the text
+        df["is_struggle"] = get_struggle_detector().flags(df["text"])
+        return df
 
-            messages.append(processed_msg)
 
-    # Second pass: Assign proper branch IDs through tree traversal
-    chats = defaultdict(list)
-    for msg in messages:
-        chats[msg["chat_name"]].append(msg)
+def process_claude_conversation(chat: dict, columns: MessageColumns):
+    """Append the messages of a single Claude conversation to ``columns``"""
+    chat_name = chat.get("name", "Unnamed Chat")
+    chat_id = chat.get("uuid", "")
+    chat_messages = chat.get("chat_messages", [])
+    messages_dict = {}
+    parent_of = {}
+
+    for msg in chat_messages:
+        msg_id = msg.get("uuid", "")
+        if msg_id:
+            messages_dict[msg_id] = msg
+            parent_of[msg_id] = msg.get("parent", msg.get("parent_message_uuid"))
+
+    for msg_id, branch_id, is_branch_point in walk_branches(
+        list(messages_dict), parent_of
+    ):
+        msg = messages_dict[msg_id]
+        columns.append(
+            chat_name,
+            chat_id,
+            msg_id,
+            parent_of[msg_id],
+            branch_id,
+            msg.get("sender", "unknown"),
+            msg.get("created_at"),
+            msg.get("text", ""),
+            is_branch_point,
+        )
 
-    processed_messages = []
-    for chat_messages in chats.values():
-        roots = [msg for msg in chat_messages if not msg["parent_message_id"]]
-        for root in roots:
-            branch_queue = [(root, "0")]
-            while branch_queue:
-                current_msg, current_branch = branch_queue.pop(0)
-                current_msg["branch_id"] = current_branch
-                processed_messages.append(current_msg)
 
-                children = [
-                    msg
-                    for msg in chat_messages
-                    if msg["parent_message_id"] == current_msg["message_id"]
-                ]
+def process_claude_messages(data: List[dict]) -> List[dict]:
+    columns = MessageColumns()
+    for chat in data:
+        process_claude_conversation(chat, columns)
+    return columns.to_frame().to_dict("records")
+
+
+def process_chatgpt_conversation(conversation: dict, columns: MessageColumns):
+    """Append the messages of a single ChatGPT conversation to ``columns``"""
+    conv_title = conversation.get("title", "Untitled Chat")
+    conv_id = conversation.get("id", "")
+
+    mapping = conversation.get("mapping") or {}
+    parent_of = {node_id: node.get("parent") for node_id, node in mapping.items()}
+    children_of = {
+        node_id: node.get("children") or [] for node_id, node in mapping.items()
+    }
+
+    for node_id, branch_id, is_branch_point in walk_branches(
+        list(mapping), parent_of, children_of
+    ):
+        node_data = mapping[node_id]
+        message_data = node_data.get("message", {})
+        if not message_data:
+            continue
 
-                if len(children) > 1:
-                    for idx, child in enumerate(children):
-                        branch_queue.append((child, f"{current_branch}.{idx}"))
-                elif children:
-                    branch_queue.append((children[0], current_branch))
+        content = message_data.get("content", {})
+        if isinstance(content, dict) and "parts" in content:
+            text = " ".join(str(part) for part in content["parts"])
+        else:
+            text = str(content)
 
-    return processed_messages
+        sender_role = message_data.get("author", {}).get("role")
+        sender = "human" if sender_role == "user" else "assistant"
+
+        columns.append(
+            conv_title,
+            conv_id,
+            message_data.get("id", ""),
+            node_data.get("parent"),
+            branch_id,
+            sender,
+            message_data.get("create_time"),
+            text,
+            is_branch_point,
+        )
 
 
 def process_chatgpt_messages(data: List[dict]) -> List[dict]:
-    messages = []
+    columns = MessageColumns()
     for conversation in data:
-        conv_title = conversation.get("title", "Untitled Chat")
-        conv_id = conversation.get("id", "")
+        process_chatgpt_conversation(conversation, columns)
 
-        if "mapping" in conversation:
-            mapping = conversation["mapping"]
-            for node_id, node_data in mapping.items():
-                message_data = node_data.get("message", {})
-                if not message_data:
-                    continue
+    df = columns.to_frame().sort_values("timestamp")
+    return df.to_dict("records")
 
-                created_at = message_data.get("create_time")
-                try:
-                    if isinstance(created_at, (int, float)):
-                        timestamp = pd.to_datetime(created_at, unit="s")
-                    else:
-                        timestamp = pd.to_datetime(created_at)
-
-                    if pd.isna(timestamp):
-                        continue
-                except (ValueError, TypeError):
-                    continue
-
-                content = message_data.get("content", {})
-                if isinstance(content, dict) and "parts" in content:
-                    text = " ".join(str(part) for part in content["parts"])
-                else:
-                    text = str(content)
-
-                sender_role = message_data.get("author", {}).get("role")
-                sender = "human" if sender_role == "user" else "assistant"
-
-                messages.append(
-                    {
-                        "chat_name": conv_title,
-                        "chat_id": conv_id,
-                        "message_id": message_data.get("id", ""),
-                        "parent_message_id": node_data.get("parent"),
-                        "branch_id": "0",  # Default branch ID
-                        "sender": sender,
-                        "timestamp": timestamp,  # This will be a pandas datetime object
-                        "text": text,
-                    }
-                )
 
-    if messages:
-        df = pd.DataFrame(messages)
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        df = df.sort_values("timestamp")
-        messages = df.to_dict("records")
+def identify_struggle_messages(df: pd.DataFrame) -> pd.DataFrame:
+    """Return the messages flagged as struggles, scanning text only if unflagged"""
+    if "is_struggle" in df.columns:
+        return df[df["is_struggle"].astype(bool)]
+    return df[get_struggle_detector().flags(df["text"])]
 
-    return messages
 
+def prepare_messages_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Drop rows without a timestamp, sort by time once and add month_year"""
+    # Ensure timestamp column is datetime
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
 
-def traverse_tree(
-    node: dict,
-    conv_title: str,
-    conv_id: str,
-    messages: List[dict],
-    branch_id: str = "0",
-):
-    message_data = node["message"]
-    if not message_data or "content" not in message_data:
-        return
-    content = message_data.get("content", {})
-    if isinstance(content, dict) and "parts" in content:
-        text = " ".join(str(part) for part in content["parts"])
-    else:
-        text = str(content)
-    try:
-        created_at = message_data.get("create_time")
-        if isinstance(created_at, (int, float)):
-            timestamp = pd.to_datetime(created_at, unit="s")
-        else:
-            timestamp = pd.to_datetime(created_at)
-        if pd.isna(timestamp):
-            return
-        sender_role = message_data.get("author", {}).get("role")
-        messages.append(
-            {
-                "chat_name": conv_title,
-                "chat_id": conv_id,
-                "message_id": message_data.get("id", ""),
-                "parent_message_id": node["parent_id"],
-                "branch_id": branch_id,
-                "sender": "human" if sender_role == "user" else "assistant",
-                "timestamp": timestamp,
-                "text": text,
-            }
-        )
-        if len(node["children"]) > 1:
-            for idx, child in enumerate(node["children"]):
-                traverse_tree(
-                    child, conv_title, conv_id, messages, f"{branch_id}.{idx}"
-                )
-        elif node["children"]:
-            traverse_tree(node["children"][0], conv_title, conv_id, messages, branch_id)
-    except (ValueError, TypeError) as e:
-        print(f"Error processing message: {e}")
+    # Remove any rows with invalid timestamps
+    df = df.dropna(subset=["timestamp"])
 
+    if not df["timestamp"].is_monotonic_increasing:
+        df = df.sort_values("timestamp", kind="stable")
+    df = df.reset_index(drop=True)
 
-def identify_struggle_messages(df: pd.DataFrame) -> pd.DataFrame:
-    struggle_keywords = [
-        "I'm struggling with",
-        "I don't understand",
-        "This is confusing",
-        "I'm stuck on",
-        "Need help with",
-        "This doesn't make sense",
-        "Can't figure out",
-        "Having trouble with",
-        "Not sure how to",
-        "Difficult to",
-        "Problem with",
-        "Issue with",
-        "Error when",
-        "Failing to",
-    ]
-    pattern = "|".join(struggle_keywords)
-    struggle_df = df[df["text"].str.contains(pattern, case=False, na=False)]
-    return struggle_df
-
-
-def detect_chat_type(file_path: str) -> Tuple[str, str]:
-    """
-    Detect whether the file contains Claude or ChatGPT chats and return the appropriate data directory
+    # Add month_year column with consistent format
+    df["month_year"] = df["timestamp"].dt.strftime("%Y-%m")
+    return df
+
+
+class BranchAccumulator:
     """
-    try:
-        with open(file_path, "r") as f:
-            data = json.load(f)
+    Running per-(chat, branch) aggregates over a time-sorted message frame.
 
-        # Check first item in the data
-        if isinstance(data, list):
-            first_item = data[0] if data else {}
+    Each month only that month's new rows are merged in. Titles keep the
+    order in which branches first appeared, so every month's titles start
+    with the previous month's titles.
+    """
 
-            # ChatGPT format detection (has 'mapping' field)
-            if isinstance(first_item, dict) and "mapping" in first_item:
-                os.makedirs(CHATGPT_DATA_DIR, exist_ok=True)
-                return "chatgpt", CHATGPT_DATA_DIR
+    def __init__(self):
+        self.title_index: Dict[Tuple[str, str], int] = {}
+        self.titles: List[str] = []
 
-            # Claude format detection (has 'chat_messages' field)
-            elif isinstance(first_item, dict) and "chat_messages" in first_item:
-                os.makedirs(CLAUDE_DATA_DIR, exist_ok=True)
-                return "claude", CLAUDE_DATA_DIR
+    def add_rows(self, rows: pd.DataFrame):
+        branches = rows[["chat_name", "branch_id"]].drop_duplicates()
+        for key in branches.itertuples(index=False, name=None):
+            if key not in self.title_index:
+                self.title_index[key] = len(self.titles)
+                self.titles.append("{} (Branch {})".format(*key))
 
-        raise ValueError("Unknown chat format")
 
-    except Exception as e:
-        raise Exception(f"Error detecting chat type: {str(e)}")
+def iter_month_titles(df, accumulator):
+    """
+    Yield (month, chat_titles, messages_end) for each month with enough data.
 
+    ``df`` must come from ``prepare_messages_frame``; ``df.iloc[:messages_end]``
+    holds every message up to and including the month.
+    """
+    month_years = df["month_year"]
+    months = month_years.unique()
+    month_ends = month_years.searchsorted(months, side="right")
+
+    start = 0
+    for month, end in zip(months, month_ends):
+        try:
+            # Merge only this month's rows into the running aggregates
+            accumulator.add_rows(df.iloc[start:end])
+            start = end
+
+            if len(accumulator.titles) < 2:
+                print(f"Skipping month {month} - insufficient data points")
+                continue
 
-def process_data_by_month(df):
-    """Process data month by month and yield updates."""
-    try:
-        # Ensure timestamp column is datetime
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
+            yield month, list(accumulator.titles), int(end)
 
-        # Remove any rows with invalid timestamps
-        df = df.dropna(subset=["timestamp"])
+        except Exception as e:
+            print(f"Error processing month {month}: {str(e)}")
+            traceback.print_exc()
+            continue
 
-        # Add month_year column with consistent format
-        df["month_year"] = df["timestamp"].dt.strftime("%Y-%m")
 
-        # Sort by month_year
-        months = sorted(df["month_year"].unique())
+def process_data_by_month(df, workers=PROCESSING_WORKERS):
+    """
+    Process data month by month and yield updates.
 
-        if not months:
+    Each update's ``messages_end`` is a row position in the prepared frame.
+    Callers that pass a frame from ``prepare_messages_frame`` can slice their
+    own copy with it.
+    """
+    try:
+        # Month ends are found with searchsorted, which needs time order
+        if (
+            "month_year" not in df.columns
+            or not df["timestamp"].is_monotonic_increasing
+        ):
+            df = prepare_messages_frame(df)
+
+        months = df["month_year"].unique()
+        if not len(months):
             raise ValueError("No valid months found in data")
 
-        accumulated_data = pd.DataFrame()
-
         print(f"Processing {len(months)} months of data...")
-        for month in months:
-            try:
-                # Get data for current month and all previous months
-                month_mask = df["month_year"] <= month
-                accumulated_data = df[month_mask].copy()
-
-                # Group messages by chat and branch for this time period
-                chat_messages = accumulated_data.groupby(["chat_name", "branch_id"])[
-                    "text"
-                ].agg(list)
-                chat_titles = [
-                    "{} (Branch {})".format(chat_name, branch_id)
-                    for chat_name, branch_id in chat_messages.index
-                ]
-
-                if len(chat_titles) < 2:
-                    print(f"Skipping month {month} - insufficient data points")
-                    continue
-
-                print(f"Processing month {month} with {len(chat_titles)} chats...")
-                # Process the month's data and yield update
-                update_data = process_single_month(chat_titles, month)
-                if update_data:
-                    yield update_data
-
-            except Exception as e:
-                print(f"Error processing month {month}: {str(e)}")
-                traceback.print_exc()
-                continue
+        month_titles = iter_month_titles(df, BranchAccumulator())
+        lineage = ClusterLineage()
+
+        if workers > 1:
+            print(f"Laying out months with {workers} worker processes...")
+            for month, chat_titles, messages_end, layout in process_months_parallel(
+                month_titles, workers
+            ):
+                try:
+                    yield build_month_update(
+                        month, chat_titles, messages_end, *layout, lineage=lineage
+                    )
+                except Exception as e:
+                    print(f"Error processing month {month}: {str(e)}")
+                    traceback.print_exc()
+            return
+
+        projector = IncrementalProjector() if PROJECTION_MODE == "incremental" else None
+        for month, chat_titles, messages_end in month_titles:
+            print(f"Processing month {month} with {len(chat_titles)} chats...")
+            # Process the month's data and yield update
+            update_data = process_single_month(
+                chat_titles, month, projector, lineage, messages_end
+            )
+            if update_data:
+                yield update_data
 
     except Exception as e:
         print(f"Error in process_data_by_month: {str(e)}")
@@ -325,55 +374,82 @@ def process_data_by_month(df):
         raise Exception(f"Error in process_data_by_month: {str(e)}")
 
 
-def process_single_month(chat_titles, month):
+def build_month_update(
+    month,
+    chat_titles,
+    messages_end,
+    embeddings_2d,
+    clusters,
+    cluster_stats,
+    lineage=None,
+):
+    """Label clusters and assemble the state update for a month"""
+    # Clusters that carry over from last month keep their labels
+    matches = lineage.match(clusters, chat_titles) if lineage is not None else {}
+    carried = lineage.carried_metadata(matches) if lineage is not None else {}
+
+    # Generate topics and metadata
+    cluster_metadata = generate_cluster_metadata(
+        clusters, chat_titles, cluster_stats, carried
+    )
+    if lineage is not None:
+        lineage.update(month, clusters, chat_titles, cluster_metadata, matches)
+        print(
+            f"Reused topic labels for {len(matches)} of "
+            f"{len(cluster_metadata)} clusters"
+        )
+
+    return {
+        "month_year": month,
+        "points": embeddings_2d.tolist(),
+        "clusters": clusters.tolist(),
+        "titles": chat_titles,
+        "topics": cluster_metadata,
+        "total_conversations": len(chat_titles),
+        "cluster_stats": cluster_stats,
+        "messages_end": messages_end,
+    }
+
+
+def process_single_month(
+    chat_titles, month, projector=None, lineage=None, messages_end=None
+):
     try:
         print(f"Starting processing for month {month} with {len(chat_titles)} chats")
 
         # Get embeddings
         print(f"Fetching embeddings for {len(chat_titles)} titles...")
-        embeddings = get_embeddings(chat_titles)
-        if embeddings is None:
+        embeddings_array = get_embeddings_array(chat_titles)
+        if embeddings_array is None:
             print("Embeddings retrieval failed.")
             return None
         print("Embeddings retrieved successfully.")
 
-        embeddings_array = np.array(embeddings)
-
-        # Perform UMAP
-        print("Performing UMAP...")
-        reducer = umap.UMAP(n_neighbors=15, min_dist=0.1, random_state=42)
-        embeddings_2d = reducer.fit_transform(embeddings_array)
-
-        # Calculate distances using scipy
-        distances = pdist(embeddings_array, metric='cosine')
-        distance_matrix = squareform(distances)
-
-        clusters = perform_clustering(distance_matrix, len(chat_titles))
-
-        # Generate topics and metadata
-        cluster_metadata = generate_cluster_metadata(
-            clusters, chat_titles, distance_matrix)
-
-        return {
-            'month_year': month,
-            'points': embeddings_2d.tolist(),
-            'clusters': clusters.tolist(),
-            'titles': chat_titles,
-            'topics': cluster_metadata,
-            'total_conversations': len(chat_titles)
-        }
+        layout = compute_month_layout(chat_titles, embeddings_array, projector)
+        return build_month_update(
+            month, chat_titles, messages_end, *layout, lineage=lineage
+        )
 
     except Exception as e:
         print(f"Error processing single month: {str(e)}")
         return None
+
+
 def analyze_branches(messages):
     """
     Enhanced branch detection that specifically looks for edited message branches
     """
     chats_with_branches = {}
 
+    # Parse every timestamp in one vectorized call
+    timestamps = pd.to_datetime(
+        pd.Series([msg.get("timestamp") for msg in messages], dtype=object),
+        utc=True,
+        errors="coerce",
+    )
+
     # First pass: Group messages and build relationships
-    for msg in messages:
+    for msg, timestamp in zip(messages, timestamps):
         chat_name = msg.get("chat_name")
         if not chat_name:
             continue
@@ -389,7 +465,6 @@ def analyze_branches(messages):
         chat_data = chats_with_branches[chat_name]
         msg_id = msg.get("message_id")
         parent_id = msg.get("parent_message_id")
-        timestamp = pd.to_datetime(msg.get("timestamp"))
 
         # Store message with additional metadata
         msg_data = {
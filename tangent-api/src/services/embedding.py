@@ -1,22 +1,129 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import requests
-import os
 
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-minilm")
+from config import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_MODEL,
+    EMBEDDING_TIMEOUT,
+)
+from services.embedding_cache import EmbeddingCache
+from services.ollama_client import api_url, get_session
 
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
 
-def get_embeddings(texts):
-    """Get embeddings from the embedding API"""
-    url = "http://localhost:11434/api/embed"
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache, opening it on first use"""
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(
+                EMBEDDING_CACHE_DIR, EMBEDDING_MODEL, EMBEDDING_CACHE_MAX_ENTRIES
+            )
+        return _embedding_cache
+
+
+def _post_embedding_batch(texts):
+    """Embed one batch of texts, retrying the batch on its own when it fails"""
+    session = get_session()
     payload = {"model": EMBEDDING_MODEL, "input": texts}
-    headers = {"Content-Type": "application/json"}
+    last_error = None
+
+    for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(min(2**attempt, 30))
+        try:
+            response = session.post(
+                api_url("embed"), json=payload, timeout=EMBEDDING_TIMEOUT
+            )
+            if response.status_code == 200:
+                embeddings = response.json().get("embeddings", [])
+                if len(embeddings) == len(texts):
+                    return embeddings
+                last_error = f"expected {len(texts)} embeddings, got {len(embeddings)}"
+            else:
+                last_error = f"status code {response.status_code}"
+        except requests.RequestException as e:
+            last_error = str(e)
+        print(f"Embedding batch attempt {attempt + 1} failed: {last_error}")
+
+    raise RuntimeError(f"Embedding batch failed: {last_error}")
+
+
+def request_embeddings(texts, on_batch=None):
+    """
+    Request embeddings for texts from the embedding API in concurrent batches.
+
+    Results are returned in input order. ``on_batch`` is called with each
+    batch's texts and embeddings as soon as that batch succeeds.
+    """
+    batches = [
+        texts[start : start + EMBEDDING_BATCH_SIZE]
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+    ]
+
+    def embed_batch(batch):
+        embeddings = _post_embedding_batch(batch)
+        if on_batch is not None:
+            on_batch(batch, embeddings)
+        return embeddings
 
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        if response.status_code == 200:
-            return response.json().get("embeddings", [])
-        else:
-            print(f"Error: Received status code {response.status_code}")
-            return None
+        if len(batches) == 1:
+            return embed_batch(batches[0])
+
+        with ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY) as executor:
+            results = executor.map(embed_batch, batches)
+            return [embedding for batch in results for embedding in batch]
     except Exception as e:
         print(f"Error getting embeddings: {str(e)}")
         return None
+
+
+def get_embeddings_array(texts):
+    """Get embeddings as a float32 matrix, only sending cache misses to the API"""
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    cache = get_embedding_cache()
+    found, missing = cache.get_many(texts)
+
+    if missing:
+        missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+        try:
+            # Cache each batch as it arrives so a failed run keeps its progress
+            fetched = request_embeddings(
+                missing_texts,
+                on_batch=lambda batch, embeddings: cache.put_many(
+                    batch, embeddings, save=False
+                ),
+            )
+        finally:
+            cache.flush()
+        if fetched is None or len(fetched) != len(missing_texts):
+            return None
+
+        fetched = np.asarray(fetched, dtype=np.float32)
+
+        fetched_by_text = dict(zip(missing_texts, fetched))
+        for i in missing:
+            found[i] = fetched_by_text[texts[i]]
+
+    return np.stack([found[i] for i in range(len(texts))])
+
+
+def get_embeddings(texts):
+    """Get embeddings from the embedding API"""
+    embeddings = get_embeddings_array(texts)
+    if embeddings is None:
+        return None
+    return embeddings.tolist()
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from utils import write_atomic, write_json_atomic
+
+
+def text_key(text: str) -> str:
+    """Content hash used to address a text in the cache"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model name, text hash).
+
+    Vectors are appended to a flat float32 file that is memory-mapped for
+    reads, and ``index.json`` maps each text hash to its row. The index is
+    replaced atomically and always covers a prefix of the vectors file, so
+    vectors appended after the last saved index are trimmed on load rather
+    than discarding the cache. The cache is cleared when it was built with a
+    different model than the current one.
+    """
+
+    def __init__(self, cache_dir: str, model: str, max_entries: int):
+        self.cache_dir = cache_dir
+        self.model = model
+        self.max_entries = max_entries
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.index_path = os.path.join(cache_dir, "index.json")
+
+        self.lock = threading.Lock()
+        self.rows: Dict[str, int] = {}
+        self.last_used: Dict[str, int] = {}
+        self.tick = 0
+        self.dim = 0
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            self._reset()
+            return
+
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Discarding unreadable embedding cache index: {str(e)}")
+            self._reset()
+            return
+
+        if index.get("model") != self.model:
+            print(
+                f"Embedding model changed ({index.get('model')} -> {self.model}), "
+                "clearing embedding cache"
+            )
+            self._reset()
+            return
+
+        self.dim = index.get("dim", 0)
+        self.tick = index.get("tick", 0)
+        for key, (row, last_used) in index.get("entries", {}).items():
+            self.rows[key] = row
+            self.last_used[key] = last_used
+
+        expected_size = len(self.rows) * self.dim * 4
+        actual_size = (
+            os.path.getsize(self.vectors_path)
+            if os.path.exists(self.vectors_path)
+            else 0
+        )
+        if actual_size > expected_size:
+            # Appended by a run that stopped before saving the index
+            print("Trimming embedding cache vectors missing from the index")
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(expected_size)
+        elif actual_size < expected_size:
+            print("Embedding cache vectors do not match index, clearing cache")
+            self._reset()
+
+    def _reset(self):
+        self.rows = {}
+        self.last_used = {}
+        self.tick = 0
+        self.dim = 0
+        self._vectors = None
+        write_atomic(self.vectors_path, b"")
+        self._save_index()
+
+    def _save_index(self):
+        index = {
+            "model": self.model,
+            "dim": self.dim,
+            "tick": self.tick,
+            "entries": {
+                key: [row, self.last_used.get(key, 0)]
+                for key, row in self.rows.items()
+            },
+        }
+        write_json_atomic(self.index_path, index)
+
+    def _matrix(self) -> np.ndarray:
+        n_rows = len(self.rows)
+        if self._vectors is None or self._vectors.shape[0] != n_rows:
+            self._vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(n_rows, self.dim)
+            )
+        return self._vectors
+
+    def get_many(self, texts: List[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """Return cached vectors by input position and the positions that missed"""
+        found = {}
+        missing = []
+        with self.lock:
+            self.tick += 1
+            matrix = self._matrix() if self.rows else None
+            for i, text in enumerate(texts):
+                key = text_key(text)
+                row = self.rows.get(key)
+                if row is None:
+                    missing.append(i)
+                    continue
+                found[i] = np.array(matrix[row])
+                self.last_used[key] = self.tick
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, texts: List[str], vectors: np.ndarray, save: bool = True):
+        """Append vectors for texts not yet cached, evicting old entries if needed"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(texts) == 0:
+            return
+
+        with self.lock:
+            if self.dim and vectors.shape[1] != self.dim:
+                print("Embedding dimension changed, clearing embedding cache")
+                self._reset()
+            self.dim = vectors.shape[1]
+            self.tick += 1
+
+            new_rows = []
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                if key in self.rows:
+                    continue
+                self.rows[key] = len(self.rows)
+                self.last_used[key] = self.tick
+                new_rows.append(vector)
+
+            if new_rows:
+                with open(self.vectors_path, "ab") as f:
+                    f.write(np.stack(new_rows).tobytes())
+
+            if len(self.rows) > self.max_entries:
+                self._evict()
+
+            if save:
+                self._save_index()
+
+    def flush(self):
+        """Persist the index after a series of unsaved puts"""
+        with self.lock:
+            self._save_index()
+
+    def _evict(self):
+        # Shrink below the limit so eviction does not rerun on every put
+        keep_count = int(self.max_entries * 0.9)
+        keep = sorted(self.rows, key=lambda k: self.last_used.get(k, 0), reverse=True)[
+            :keep_count
+        ]
+        keep_rows = np.array([self.rows[key] for key in keep], dtype=np.int64)
+
+        matrix = self._matrix()
+        kept_vectors = np.array(matrix[np.sort(keep_rows)]) if len(keep) else None
+        order = np.argsort(keep_rows)
+
+        self._vectors = None
+        # Compaction moves rows, so the saved index must not outlive the old
+        # vectors file. A crash before the new index is saved clears the cache.
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        write_atomic(
+            self.vectors_path,
+            kept_vectors.tobytes() if kept_vectors is not None else b"",
+        )
+
+        sorted_keys = [keep[i] for i in order]
+        self.rows = {key: row for row, key in enumerate(sorted_keys)}
+        self.last_used = {key: self.last_used.get(key, 0) for key in sorted_keys}
+        self._save_index()
+        print(f"Evicted embedding cache down to {len(self.rows)} entries")
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "model": self.model,
+                "entries": len(self.rows),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,81 @@
+import gzip
+import hashlib
+import os
+from typing import Iterable
+
+from flask import Response, request
+
+from config import COMPRESSION_LEVEL, COMPRESSION_MIN_BYTES
+from services.artifact_cache import get_artifact_cache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/html"}
+
+
+def artifact_etag(data_dir: str, file_names: Iterable[str]) -> str:
+    """
+    Build an ETag from the data dir's cache generation and the mtime and size
+    of the files a response is built from, without reading them.
+    """
+    parts = [str(get_artifact_cache().generation(data_dir))]
+    for file_name in file_names:
+        try:
+            stat = os.stat(os.path.join(data_dir, file_name))
+            parts.append(f"{file_name}:{stat.st_mtime_ns}:{stat.st_size}")
+        except FileNotFoundError:
+            parts.append(f"{file_name}:missing")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def is_not_modified(etag: str) -> bool:
+    """True if the client already holds the representation tagged ``etag``"""
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified(etag: str) -> Response:
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def tag_response(response: Response, etag: str) -> Response:
+    # Weak, since the body may be compressed differently per client
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def compress_response(response: Response) -> Response:
+    """Compress a JSON or text response with brotli or gzip per Accept-Encoding"""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        encoding = "br"
+    elif accepted["gzip"]:
+        encoding = "gzip"
+    else:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return response
+
+    if encoding == "br":
+        data = brotli.compress(data, quality=min(COMPRESSION_LEVEL, 11))
+    else:
+        data = gzip.compress(data, compresslevel=COMPRESSION_LEVEL)
+
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,140 @@
+import json
+import os
+import re
+from typing import Iterator, Tuple
+
+import pandas as pd
+
+from config import CHATGPT_DATA_DIR, CLAUDE_DATA_DIR
+from services.data_processing import (
+    MessageColumns,
+    process_chatgpt_conversation,
+    process_claude_conversation,
+)
+
+READ_CHUNK_SIZE = 1 << 20
+SNIFF_BYTES = 64 * 1024
+
+# Top-level conversation keys that identify each export format. The
+# lookbehind skips escaped quotes, so keys inside message text do not match.
+FORMAT_KEY_PATTERN = re.compile(r'(?<!\\)"(mapping|chat_messages)"\s*:')
+FORMAT_BY_KEY = {"mapping": "chatgpt", "chat_messages": "claude"}
+DATA_DIR_BY_FORMAT = {"chatgpt": CHATGPT_DATA_DIR, "claude": CLAUDE_DATA_DIR}
+
+
+def iter_json_array(file_path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator:
+    """
+    Yield the elements of a top-level JSON array one at a time.
+
+    Only the element being decoded is held in memory. When an element is
+    incomplete, the read size doubles, so a large element is decoded a
+    logarithmic number of times rather than once per chunk.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8-sig") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def fill(size):
+            nonlocal buffer, pos, eof
+            chunk = f.read(size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                fill(chunk_size)
+
+        skip_whitespace()
+        if pos >= len(buffer) or buffer[pos] != "[":
+            raise ValueError("Expected a JSON array of conversations")
+        pos += 1
+
+        read_size = chunk_size
+        while True:
+            skip_whitespace()
+            if pos >= len(buffer):
+                raise ValueError("Unexpected end of file inside JSON array")
+            if buffer[pos] == "]":
+                return
+            if buffer[pos] == ",":
+                pos += 1
+                continue
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill(read_size)
+                read_size *= 2
+                continue
+
+            if end == len(buffer) and not eof:
+                # A bare number could continue past the buffer
+                fill(read_size)
+                continue
+
+            pos = end
+            read_size = chunk_size
+            yield element
+
+
+def sniff_chat_type(file_path: str) -> str:
+    """Detect the export format from the first few KB of the file"""
+    with open(file_path, "r", encoding="utf-8-sig") as f:
+        head = f.read(SNIFF_BYTES)
+
+    if not head.lstrip().startswith("["):
+        raise ValueError("Unknown chat format")
+
+    match = FORMAT_KEY_PATTERN.search(head)
+    if match:
+        return FORMAT_BY_KEY[match.group(1)]
+
+    # The first conversation's keys were not in the sniffed prefix
+    for first_item in iter_json_array(file_path):
+        if isinstance(first_item, dict):
+            if "mapping" in first_item:
+                return "chatgpt"
+            if "chat_messages" in first_item:
+                return "claude"
+        break
+
+    raise ValueError("Unknown chat format")
+
+
+def detect_chat_type(file_path: str) -> Tuple[str, str]:
+    """
+    Detect whether the file contains Claude or ChatGPT chats and return the appropriate data directory
+    """
+    try:
+        chat_type = sniff_chat_type(file_path)
+        data_dir = DATA_DIR_BY_FORMAT[chat_type]
+        os.makedirs(data_dir, exist_ok=True)
+        return chat_type, data_dir
+
+    except Exception as e:
+        raise Exception(f"Error detecting chat type: {str(e)}")
+
+
+def read_messages_frame(file_path: str, chat_type: str) -> pd.DataFrame:
+    """Stream an export into a columnar message DataFrame"""
+    process_conversation = (
+        process_chatgpt_conversation
+        if chat_type == "chatgpt"
+        else process_claude_conversation
+    )
+    columns = MessageColumns()
+    for conversation in iter_json_array(file_path):
+        if isinstance(conversation, dict):
+            process_conversation(conversation, columns)
+    return columns.to_frame()
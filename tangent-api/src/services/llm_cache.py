@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+def response_key(model: str, prompt: str, options: dict) -> str:
+    """Cache key for a generation request: (model, prompt hash, options)"""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return hashlib.sha256(
+        json.dumps([model, prompt_hash, options], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Persistent cache of LLM responses stored in SQLite.
+
+    Entries expire ``ttl`` seconds after they were written, and the least
+    recently used entries are evicted once the cache grows past
+    ``max_entries``.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)"
+        )
+        self.connection.commit()
+
+    def get(self, model: str, prompt: str, options: dict) -> Optional[str]:
+        key = response_key(model, prompt, options)
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.connection.execute(
+                        "DELETE FROM responses WHERE key = ?", (key,)
+                    )
+                    self.connection.commit()
+                self.misses += 1
+                return None
+
+            self.connection.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self.connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, model: str, prompt: str, options: dict, response: str):
+        key = response_key(model, prompt, options)
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self._evict(now)
+            self.connection.commit()
+
+    def _evict(self, now: float):
+        self.connection.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+        )
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            # Shrink below the limit so eviction does not rerun on every put
+            excess = count - int(self.max_entries * 0.9)
+            self.connection.execute(
+                """DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_used LIMIT ?
+                )""",
+                (excess,),
+            )
+
+    def stats(self) -> dict:
+        with self.lock:
+            (count,) = self.connection.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()
+            return {
+                "entries": count,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
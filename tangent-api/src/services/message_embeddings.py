@@ -0,0 +1,303 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY, EMBEDDING_MODEL
+from services.embedding import request_embeddings
+from services.embedding_cache import text_key
+from utils import write_atomic, write_json_atomic
+
+
+STORE_VERSION = 2
+
+# Store directory under each data dir
+STORE_DIR = "message_embeddings"
+
+MessageKey = Tuple[str, str]
+
+
+class MessageEmbeddingStore:
+    """
+    Append-only store of message embeddings, one per (chat_id, message_id).
+
+    Message ids are only unique within a chat, so rows are keyed on both.
+    Vectors are appended to a flat float32 file. ``index.jsonl`` gets one
+    [chat_id, message_id, text hash] line per row, and ``meta.json`` records
+    the model and dimension. A message whose text changed gets a new row,
+    and the latest row for a key wins. Nothing is ever rewritten, so adding a
+    batch costs the size of the batch, and readers in other processes can
+    memory-map the vectors while they grow. The store is cleared when it was
+    built with a different model or index format.
+    """
+
+    def __init__(self, store_dir: str, model: str = EMBEDDING_MODEL):
+        self.store_dir = store_dir
+        self.model = model
+        self.vectors_path = os.path.join(store_dir, "vectors.f32")
+        self.index_path = os.path.join(store_dir, "index.jsonl")
+        self.meta_path = os.path.join(store_dir, "meta.json")
+
+        self.lock = threading.Lock()
+        self.entries: Dict[MessageKey, Tuple[int, str]] = {}
+        self.row_count = 0
+        self.dim = 0
+
+        os.makedirs(store_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        meta = _read_meta(self.store_dir)
+        if meta is None or not os.path.exists(self.vectors_path):
+            self._reset()
+            return
+        if meta.get("model") != self.model:
+            print(
+                f"Embedding model changed ({meta.get('model')} -> {self.model}), "
+                "clearing message embeddings"
+            )
+            self._reset()
+            return
+        if meta.get("version") != STORE_VERSION:
+            print("Message embedding index format changed, clearing message embeddings")
+            self._reset()
+            return
+
+        self.dim = meta.get("dim", 0)
+        index_lines = _read_index_lines(self.store_dir)
+
+        # A crash mid-append can leave vectors without index lines or the
+        # reverse. Keep the rows present in both and cut off the rest.
+        vector_rows = (
+            os.path.getsize(self.vectors_path) // (self.dim * 4) if self.dim else 0
+        )
+        self.row_count = min(len(index_lines), vector_rows)
+        self.entries = {
+            (chat_id, message_id): (row, digest)
+            for row, (chat_id, message_id, digest) in enumerate(
+                index_lines[: self.row_count]
+            )
+        }
+        # Only unindexed rows are cut, which readers never map
+        with open(self.vectors_path, "r+b") as f:
+            f.truncate(self.row_count * self.dim * 4)
+        if len(index_lines) != self.row_count:
+            write_atomic(
+                self.index_path,
+                "".join(
+                    json.dumps(list(line)) + "\n"
+                    for line in index_lines[: self.row_count]
+                ),
+            )
+
+    def _reset(self, dim: int = 0):
+        self.entries = {}
+        self.row_count = 0
+        self.dim = dim
+        # Swap in empty files rather than truncating, so readers that mapped
+        # the old vectors keep a valid mapping
+        write_atomic(self.vectors_path, b"")
+        write_atomic(self.index_path, b"")
+        write_json_atomic(
+            self.meta_path,
+            {"model": self.model, "dim": dim, "version": STORE_VERSION},
+        )
+
+    def matrix(self) -> np.ndarray:
+        """Read-only memory map of every stored vector"""
+        if not self.row_count:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(
+            self.vectors_path,
+            dtype=np.float32,
+            mode="r",
+            shape=(self.row_count, self.dim),
+        )
+
+    def rows_for(self, keys: List[MessageKey], texts: List[str]) -> np.ndarray:
+        """Row of each message's current text, or -1 if it is not stored"""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        with self.lock:
+            for i, (key, text) in enumerate(zip(keys, texts)):
+                entry = self.entries.get(key)
+                if entry is not None and entry[1] == text_key(text):
+                    rows[i] = entry[0]
+        return rows
+
+    def append(self, keys: List[MessageKey], texts: List[str], vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+
+        with self.lock:
+            if vectors.shape[1] != self.dim:
+                if self.dim:
+                    print("Embedding dimension changed, clearing message embeddings")
+                self._reset(vectors.shape[1])
+
+            # Vectors first, so a crash never indexes rows that were not written
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            lines = []
+            for offset, (key, text) in enumerate(zip(keys, texts)):
+                digest = text_key(text)
+                self.entries[key] = (self.row_count + offset, digest)
+                lines.append(json.dumps([*key, digest]) + "\n")
+            with open(self.index_path, "a") as f:
+                f.writelines(lines)
+            self.row_count += len(keys)
+
+    def fill(
+        self,
+        messages: pd.DataFrame,
+        # Several client batches per save, so they are sent concurrently
+        batch_size: int = EMBEDDING_BATCH_SIZE * EMBEDDING_CONCURRENCY,
+    ) -> Optional[np.ndarray]:
+        """
+        Return a row per message, embedding the messages not yet stored.
+
+        Missing messages are embedded in batches straight through the
+        embedding client, bypassing the title cache. Each batch is appended as
+        soon as it arrives, so an interrupted run keeps its progress.
+        Messages without a message_id are never stored and keep row -1, as
+        does a key repeated with different texts for all but one of them.
+        Returns None if a batch fails.
+        """
+        keys = list(
+            zip(
+                messages["chat_id"].astype(object).fillna("").astype(str).tolist(),
+                messages["message_id"].fillna("").astype(str).tolist(),
+            )
+        )
+        texts = messages["text"].astype(str).tolist()
+        rows = self.rows_for(keys, texts)
+
+        missing = {}
+        for i in np.flatnonzero(rows < 0):
+            if keys[i][1]:
+                missing.setdefault(keys[i], texts[i])
+        missing_keys = list(missing)
+        if missing_keys:
+            print(f"Embedding {len(missing_keys)} new messages")
+
+        for start in range(0, len(missing_keys), batch_size):
+            batch_keys = missing_keys[start : start + batch_size]
+            batch_texts = [missing[key] for key in batch_keys]
+            embeddings = request_embeddings(batch_texts)
+            if embeddings is None or len(embeddings) != len(batch_texts):
+                return None
+            self.append(batch_keys, batch_texts, embeddings)
+
+        if missing_keys:
+            rows = self.rows_for(keys, texts)
+        return rows
+
+    def vectors_for(
+        self, messages: pd.DataFrame
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Fill the store for ``messages`` and return (memory map, rows).
+
+        Nothing is copied, so callers gather only the rows they need. Rows
+        are -1 for messages without a stored vector.
+        """
+        rows = self.fill(messages)
+        if rows is None:
+            return None
+        return self.matrix(), rows
+
+
+_stores: Dict[str, MessageEmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_message_embedding_store(data_dir: str) -> MessageEmbeddingStore:
+    """
+    Return the writable store under ``data_dir``, opening it on first use.
+
+    Opening repairs or clears the files, so only the processing side should
+    call this. Readers use ``open_message_vectors``.
+    """
+    store_dir = os.path.abspath(os.path.join(data_dir, STORE_DIR))
+    with _stores_lock:
+        store = _stores.get(store_dir)
+        if store is None:
+            store = MessageEmbeddingStore(store_dir)
+            _stores[store_dir] = store
+        return store
+
+
+def _read_meta(store_dir: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(store_dir, "meta.json"), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _read_index_lines(store_dir: str) -> List[Tuple[str, str, str]]:
+    lines = []
+    try:
+        with open(os.path.join(store_dir, "index.jsonl"), "r") as f:
+            for line in f:
+                try:
+                    chat_id, message_id, digest = json.loads(line)
+                except ValueError:
+                    # A torn final line from an interrupted append
+                    break
+                lines.append((chat_id, message_id, digest))
+    except FileNotFoundError:
+        pass
+    return lines
+
+
+def open_message_vectors(store_dir: str) -> Optional[Dict]:
+    """
+    Open a message embedding store read-only, for API workers.
+
+    Never repairs, truncates or clears anything, so it is safe while the
+    processor appends. Only rows present in both the index and the vectors
+    file are mapped. Returns {"dim", "rows", "matrix"}, where ``rows`` maps
+    (chat_id, message_id) to its latest row of the memory-mapped ``matrix``,
+    or None when the store is missing, empty or from another model or format.
+    """
+    meta = _read_meta(store_dir)
+    if (
+        meta is None
+        or meta.get("model") != EMBEDDING_MODEL
+        or meta.get("version") != STORE_VERSION
+        or not meta.get("dim")
+    ):
+        return None
+
+    dim = meta["dim"]
+    try:
+        vector_rows = os.path.getsize(os.path.join(store_dir, "vectors.f32")) // (
+            dim * 4
+        )
+    except FileNotFoundError:
+        return None
+    index_lines = _read_index_lines(store_dir)
+    row_count = min(len(index_lines), vector_rows)
+    if not row_count:
+        return None
+
+    matrix = np.memmap(
+        os.path.join(store_dir, "vectors.f32"),
+        dtype=np.float32,
+        mode="r",
+        shape=(row_count, dim),
+    )
+    rows = {
+        (chat_id, message_id): row
+        for row, (chat_id, message_id, _) in enumerate(index_lines[:row_count])
+    }
+    return {"dim": dim, "rows": rows, "matrix": matrix}
+
+
+def load_message_vectors(index_path: str) -> Optional[Dict]:
+    """ArtifactCache loader for a store's ``index.jsonl``"""
+    return open_message_vectors(os.path.dirname(index_path))
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils import write_atomic
+
+MANIFEST_VERSION = 1
+
+# Segment indexes by manifest path, as (manifest mtime, indexes)
+_index_cache: Dict[str, Tuple[int, List]] = {}
+
+
+class MessageStore:
+    """
+    Append-only message store with one JSON Lines segment per month.
+
+    ``states/messages/manifest.json`` lists the segments in month order. Each
+    segment holds only the messages first seen in that month, so reading the
+    messages as of a month means concatenating every segment up to it.
+    Segment files are named after a hash of their content, so reprocessing
+    the same data leaves unchanged segments untouched and a rewritten month
+    never overwrites a file a reader may still be using. A run publishes its
+    segments all at once by swapping in a new manifest when it finishes.
+
+    Every segment has a sidecar ``.index.json`` with the byte range of each
+    (chat_name, branch_id), so a single chat is read without parsing the rest.
+    """
+
+    def __init__(self, data_dir: str):
+        self.store_dir = os.path.join(data_dir, "states", "messages")
+        self.manifest_path = os.path.join(self.store_dir, "manifest.json")
+        self.segments: List[Dict] = []
+
+    def load_manifest(self) -> List[Dict]:
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest["segments"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Ignoring unreadable message manifest: {str(e)}")
+        return []
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def begin(self):
+        """Start a new run. Readers keep seeing the last run until finish()"""
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.segments = []
+
+    def append_segment(self, month_year: str, messages: pd.DataFrame):
+        """Write one month's new messages and stage them for the manifest"""
+        # Keep each chat branch contiguous and in time order so it can be
+        # read back with a single seek. Equal values sort together whatever
+        # the column dtype, including categoricals in category order.
+        messages = messages.sort_values(
+            ["chat_name", "branch_id", "timestamp"], kind="stable"
+        )
+        # Escaping non-ASCII keeps every record on one line with no line or
+        # paragraph separators inside it, which the byte offsets rely on
+        payload = messages.to_json(
+            orient="records", lines=True, date_format="iso", force_ascii=True
+        )
+        if payload and not payload.endswith("\n"):
+            payload += "\n"
+        digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+        file_name = f"segment_{month_year}_{digest[:12]}.jsonl"
+        path = os.path.join(self.store_dir, file_name)
+        index_path = _index_path(path)
+        if not (os.path.exists(path) and os.path.exists(index_path)):
+            write_atomic(path, payload)
+            index = build_segment_index(
+                payload,
+                messages["chat_name"].tolist(),
+                messages["branch_id"].tolist(),
+            )
+            write_atomic(index_path, json.dumps(index))
+
+        self.segments.append(
+            {
+                "month_year": month_year,
+                "file": file_name,
+                "count": len(messages),
+                "sha1": digest,
+            }
+        )
+
+    def finish(self):
+        """
+        Publish the run's segments, then remove the ones no longer listed.
+
+        The new manifest is written to a staging file and swapped in with
+        os.replace, so readers see either the previous run or this one. A run
+        that appended no segments publishes nothing and deletes nothing.
+        """
+        if not self.segments:
+            print("No message segments written, keeping the previous manifest")
+            return
+        write_atomic(
+            self.manifest_path,
+            json.dumps({"version": MANIFEST_VERSION, "segments": self.segments}),
+        )
+        current = set()
+        for segment in self.segments:
+            current.add(segment["file"])
+            current.add(os.path.basename(_index_path(segment["file"])))
+        for file_name in os.listdir(self.store_dir):
+            if file_name.startswith("segment_") and file_name not in current:
+                os.remove(os.path.join(self.store_dir, file_name))
+
+    def read_messages(self, month_year: Optional[str] = None) -> List[Dict]:
+        """Return every message up to and including ``month_year`` (default: all)"""
+        messages = []
+        for segment in self.load_manifest():
+            if month_year is not None and segment["month_year"] > month_year:
+                break
+            with open(os.path.join(self.store_dir, segment["file"]), "r") as f:
+                messages.extend(json.loads(line) for line in f if line.strip())
+        return messages
+
+    def load_indexes(self) -> List[Tuple[str, Dict]]:
+        """
+        Return (segment path, chat index) pairs for every segment in order.
+
+        Indexes are kept in memory until the manifest changes on disk.
+        """
+        mtime = os.stat(self.manifest_path).st_mtime_ns
+        cached = _index_cache.get(self.manifest_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        indexes = []
+        for segment in self.load_manifest():
+            path = os.path.join(self.store_dir, segment["file"])
+            with open(_index_path(path), "r") as f:
+                indexes.append((path, json.load(f)))
+        _index_cache[self.manifest_path] = (mtime, indexes)
+        return indexes
+
+    def read_chat(self, chat_name: str, branch_id: Optional[str] = None) -> List[Dict]:
+        """
+        Return one chat's messages, optionally limited to a single branch.
+
+        Only the byte ranges of the chat are read. Messages within each branch
+        are in timestamp order.
+        """
+        messages = []
+        for path, index in self.load_indexes():
+            branches = index.get(chat_name)
+            if not branches:
+                continue
+            if branch_id is None:
+                ranges = list(branches.values())
+            elif branch_id in branches:
+                ranges = [branches[branch_id]]
+            else:
+                continue
+            with open(path, "rb") as f:
+                for offset, length in ranges:
+                    f.seek(offset)
+                    lines = f.read(length).split(b"\n")
+                    messages.extend(json.loads(line) for line in lines if line)
+        return messages
+
+
+def build_segment_index(
+    payload: str, chat_names: List[str], branch_ids: List[str]
+) -> Dict[str, Dict[str, List[int]]]:
+    """Map chat_name -> branch_id -> [byte offset, byte length] in a segment"""
+    index = defaultdict(dict)
+    offset = 0
+    for line, chat_name, branch_id in zip(
+        payload.split("\n"), chat_names, branch_ids
+    ):
+        size = len(line.encode("utf-8")) + 1
+        entry = index[str(chat_name)].get(str(branch_id))
+        if entry is None:
+            index[str(chat_name)][str(branch_id)] = [offset, size]
+        else:
+            entry[1] += size
+        offset += size
+    return index
+
+
+def _index_path(segment_path: str) -> str:
+    return segment_path[: -len(".jsonl")] + ".index.json"
+
+
+def load_messages(data_dir: str, month_year: Optional[str] = None) -> Optional[List]:
+    """
+    Load messages from the segment store, falling back to the legacy
+    cumulative ``states/messages_{month}.json`` files. Returns None when no
+    message data exists.
+    """
+    store = MessageStore(data_dir)
+    if store.exists():
+        print(f"Loading messages from: {store.store_dir}")
+        return store.read_messages(month_year)
+
+    states_dir = os.path.join(data_dir, "states")
+    if not os.path.isdir(states_dir):
+        return None
+    message_files = sorted(
+        f
+        for f in os.listdir(states_dir)
+        if f.startswith("messages_") and f.endswith(".json")
+    )
+    if month_year is not None:
+        message_files = [f for f in message_files if f[9:-5] <= month_year]
+    if not message_files:
+        return None
+
+    messages_path = os.path.join(states_dir, message_files[-1])
+    print(f"Loading messages from: {messages_path}")
+    with open(messages_path, "r") as f:
+        return json.load(f)
+
+
+def load_chat_messages(
+    data_dir: str, chat_name: str, branch_id: Optional[str] = None
+) -> Optional[List]:
+    """
+    Load one chat's messages, each branch in timestamp order. Returns None when
+    no message data exists.
+    """
+    store = MessageStore(data_dir)
+    if store.exists():
+        return store.read_chat(chat_name, branch_id)
+
+    all_messages = load_messages(data_dir)
+    if all_messages is None:
+        return None
+    chat_messages = [
+        msg
+        for msg in all_messages
+        if msg.get("chat_name") == chat_name
+        and (branch_id is None or msg.get("branch_id", "0") == branch_id)
+    ]
+    # Legacy files are not sorted, parse the timestamps in one call
+    timestamps = pd.to_datetime(
+        pd.Series([msg.get("timestamp") for msg in chat_messages], dtype=object),
+        utc=True,
+        errors="coerce",
+    )
+    order = np.argsort(timestamps.to_numpy(), kind="stable")
+    return [chat_messages[i] for i in order]
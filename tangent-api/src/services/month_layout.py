@@ -0,0 +1,35 @@
+from scipy.spatial.distance import pdist, squareform
+
+from services.cluster_stats import compute_cluster_stats
+from services.clustering import (
+    normalize_embeddings,
+    perform_clustering,
+    perform_embedding_clustering,
+    use_sparse_clustering,
+)
+from services.projection import fit_projection
+
+
+def compute_month_layout(chat_titles, embeddings_array, projector=None):
+    """Project, cluster and summarize one month's embeddings"""
+    # Perform UMAP
+    print("Performing UMAP...")
+    if projector is not None:
+        embeddings_2d = projector.project(chat_titles, embeddings_array)
+    else:
+        _, embeddings_2d = fit_projection(embeddings_array)
+
+    normalized = normalize_embeddings(embeddings_array)
+    distance_matrix = None
+    if use_sparse_clustering(len(chat_titles)):
+        # Cluster normalized embeddings directly to avoid the n x n matrix
+        clusters = perform_embedding_clustering(normalized)
+    else:
+        # Calculate distances using scipy
+        distances = pdist(embeddings_array, metric="cosine")
+        distance_matrix = squareform(distances)
+
+        clusters = perform_clustering(distance_matrix, len(chat_titles))
+
+    cluster_stats = compute_cluster_stats(clusters, normalized, distance_matrix)
+    return embeddings_2d, clusters, cluster_stats
@@ -0,0 +1,100 @@
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    EMBEDDING_CONCURRENCY,
+    GENERATION_CONCURRENCY,
+    GENERATION_TIMEOUT,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+    OLLAMA_URL,
+)
+from services.llm_cache import LLMResponseCache
+
+# Enough pooled connections for every concurrent embedding and generation call
+POOL_SIZE = max(16, EMBEDDING_CONCURRENCY + GENERATION_CONCURRENCY)
+
+_session = None
+_session_lock = threading.Lock()
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return a shared keep-alive session for talking to Ollama"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Content-Type": "application/json"})
+            _session = session
+        return _session
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Return the process-wide LLM response cache, opening it on first use"""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache(
+                LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+            )
+        return _llm_cache
+
+
+def api_url(path: str) -> str:
+    return f"{OLLAMA_URL.rstrip('/')}/api/{path.lstrip('/')}"
+
+
+class GenerationError(Exception):
+    pass
+
+
+def generate(
+    model: str,
+    prompt: str,
+    options: dict,
+    timeout: float = GENERATION_TIMEOUT,
+    use_cache: bool = True,
+    response_format: Optional[str] = None,
+) -> str:
+    """
+    Run a non-streaming /api/generate call and return the response text.
+
+    Responses are served from and written to the LLM response cache unless
+    ``use_cache`` is False. Empty responses are not cached. Pass
+    ``response_format="json"`` to constrain the model to JSON output.
+    """
+    cache_options = options
+    if response_format:
+        cache_options = {**options, "format": response_format}
+
+    cache = get_llm_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(model, prompt, cache_options)
+        if cached is not None:
+            return cached
+
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+        "options": options,
+    }
+    if response_format:
+        payload["format"] = response_format
+    response = get_session().post(api_url("generate"), json=payload, timeout=timeout)
+    if response.status_code != 200:
+        raise GenerationError(f"Received status code {response.status_code}")
+
+    text = response.json().get("response", "")
+    if cache is not None and text.strip():
+        cache.put(model, prompt, cache_options, text)
+    return text
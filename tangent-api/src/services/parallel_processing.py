@@ -0,0 +1,91 @@
+import os
+import tempfile
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+
+from services.embedding import get_embeddings_array
+from services.month_layout import compute_month_layout
+
+# Embedding matrix opened read-only by each worker process
+_worker_embeddings = None
+
+
+def _attach_embeddings(embeddings_path):
+    global _worker_embeddings
+    _worker_embeddings = np.load(embeddings_path, mmap_mode="r")
+
+
+def _layout_month(chat_titles, rows):
+    embeddings_array = np.asarray(_worker_embeddings[rows])
+    return compute_month_layout(chat_titles, embeddings_array)
+
+
+def process_months_parallel(month_titles, workers):
+    """
+    Lay out months in a process pool, yielding in month order.
+
+    Takes (month, titles, messages_end) items and yields
+    (month, titles, messages_end, layout).
+
+    Titles for every month are embedded once up front and written to a
+    memory-mapped .npy file, so workers read the rows they need from the page
+    cache instead of receiving pickled copies. Each month is projected with a
+    full UMAP fit because the incremental projector depends on the previous
+    month.
+    """
+    month_titles = list(month_titles)
+    if not month_titles:
+        return
+
+    all_titles = list(
+        dict.fromkeys(title for _, titles, _ in month_titles for title in titles)
+    )
+    print(f"Fetching embeddings for {len(all_titles)} titles across all months...")
+    embeddings = get_embeddings_array(all_titles)
+    if embeddings is None:
+        raise Exception("Embeddings retrieval failed.")
+    row_of = {title: row for row, title in enumerate(all_titles)}
+
+    with tempfile.TemporaryDirectory(prefix="tangent-embeddings-") as tmp_dir:
+        embeddings_path = os.path.join(tmp_dir, "embeddings.npy")
+        np.save(embeddings_path, embeddings)
+        del embeddings
+
+        # Spawn avoids forking the API process while its threads hold locks
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_attach_embeddings,
+            initargs=(embeddings_path,),
+        ) as executor:
+            pending = deque()
+            months = iter(month_titles)
+
+            def submit_next():
+                for month, titles, messages_end in months:
+                    rows = np.fromiter(
+                        (row_of[title] for title in titles), dtype=np.int64
+                    )
+                    future = executor.submit(_layout_month, titles, rows)
+                    pending.append((month, titles, messages_end, future))
+                    return
+
+            # Keep a bounded window in flight so finished layouts don't pile up
+            for _ in range(workers * 2):
+                submit_next()
+
+            while pending:
+                month, titles, messages_end, future = pending.popleft()
+                submit_next()
+                try:
+                    layout = future.result()
+                except Exception as e:
+                    print(f"Error processing month {month}: {str(e)}")
+                    traceback.print_exc()
+                    continue
+                yield month, titles, messages_end, layout
@@ -0,0 +1,45 @@
+import struct
+
+import numpy as np
+
+from utils import write_atomic
+
+# Layout, all little-endian:
+#   header  magic "TGPT", uint16 version, uint16 dims, uint32 point count
+#   coords  float32[count * dims], row-major
+#   labels  int32[count], cluster label per point (-1 for none)
+# The header is 12 bytes, so both arrays are 4-byte aligned and can be
+# viewed directly as a Float32Array and Int32Array in the browser.
+MAGIC = b"TGPT"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+MIMETYPE = "application/octet-stream"
+
+
+def encode_points(points, clusters) -> bytes:
+    """Pack 2D/3D point coordinates and cluster labels into the binary layout"""
+    coords = np.asarray(points, dtype="<f4")
+    if coords.ndim != 2:
+        coords = coords.reshape(-1, 2)
+    labels = np.asarray(clusters, dtype="<i4").reshape(-1)
+    if len(labels) != len(coords):
+        raise ValueError(f"Got {len(coords)} points but {len(labels)} cluster labels")
+
+    header = HEADER.pack(MAGIC, VERSION, coords.shape[1], len(coords))
+    return header + coords.tobytes() + labels.tobytes()
+
+
+def decode_points(data: bytes):
+    """Unpack a binary points buffer into (coords, labels) arrays"""
+    magic, version, dims, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a supported points file")
+    coords = np.frombuffer(data, dtype="<f4", count=count * dims, offset=HEADER.size)
+    labels = np.frombuffer(
+        data, dtype="<i4", count=count, offset=HEADER.size + coords.nbytes
+    )
+    return coords.reshape(count, dims), labels
+
+
+def write_points_file(path: str, points, clusters):
+    write_atomic(path, encode_points(points, clusters))
@@ -0,0 +1,82 @@
+from typing import Dict, List
+
+import numpy as np
+import umap
+
+from config import PROJECTION_REFIT_THRESHOLD
+
+UMAP_PARAMS = {"n_neighbors": 15, "min_dist": 0.1, "random_state": 42}
+
+
+def fit_projection(embeddings: np.ndarray, init="spectral"):
+    """Fit a UMAP reducer and return it with the 2D coordinates"""
+    reducer = umap.UMAP(init=init, **UMAP_PARAMS)
+    embeddings_2d = reducer.fit_transform(embeddings)
+    return reducer, embeddings_2d
+
+
+class IncrementalProjector:
+    """
+    Projects accumulated embeddings to 2D across consecutive monthly states.
+
+    The reducer is fit once on an anchor set. Later months keep the
+    coordinates of points that were already placed and position new points
+    with ``transform``. When the share of points the reducer was not fit on
+    passes ``refit_threshold`` it is refit, warm-started from the current
+    layout so existing points stay close to where they were.
+    """
+
+    def __init__(self, refit_threshold: float = PROJECTION_REFIT_THRESHOLD):
+        self.refit_threshold = refit_threshold
+        self.reducer = None
+        self.anchor_count = 0
+        self.coordinates: Dict[str, np.ndarray] = {}
+
+    def drift(self, n_points: int) -> float:
+        """Share of points that were placed without being part of the fit"""
+        if n_points == 0:
+            return 0.0
+        return (n_points - self.anchor_count) / n_points
+
+    def project(self, titles: List[str], embeddings: np.ndarray) -> np.ndarray:
+        n_points = len(titles)
+        if (
+            self.reducer is None
+            or self.anchor_count <= UMAP_PARAMS["n_neighbors"]
+            or self.drift(n_points) > self.refit_threshold
+        ):
+            return self._fit(titles, embeddings)
+
+        embeddings_2d = self._place(titles, embeddings)
+        self._remember(titles, embeddings_2d)
+        return embeddings_2d
+
+    def _place(self, titles: List[str], embeddings: np.ndarray) -> np.ndarray:
+        embeddings_2d = np.zeros((len(titles), 2), dtype=np.float32)
+        new_indices = []
+        for i, title in enumerate(titles):
+            known = self.coordinates.get(title)
+            if known is None:
+                new_indices.append(i)
+            else:
+                embeddings_2d[i] = known
+
+        if new_indices:
+            embeddings_2d[new_indices] = self.reducer.transform(embeddings[new_indices])
+        return embeddings_2d
+
+    def _fit(self, titles: List[str], embeddings: np.ndarray) -> np.ndarray:
+        init = "spectral"
+        if self.reducer is not None:
+            # Warm start from the current layout to keep coordinates stable
+            print(f"Projection drift {self.drift(len(titles)):.2f}, refitting UMAP")
+            init = self._place(titles, embeddings).astype(np.float64)
+
+        self.reducer, embeddings_2d = fit_projection(embeddings, init=init)
+        self.anchor_count = len(titles)
+        self._remember(titles, embeddings_2d)
+        return embeddings_2d
+
+    def _remember(self, titles: List[str], embeddings_2d: np.ndarray):
+        for title, point in zip(titles, embeddings_2d):
+            self.coordinates[title] = point
@@ -1,6 +1,7 @@
-import requests
 import os
 
+from services.ollama_client import GenerationError, generate
+
 GENERATION_MODEL = os.getenv("GENERATION_MODEL", "qwen2.5-coder:7b")
 
 
@@ -18,26 +19,12 @@ Summarize the key challenges they faced and provide a reflection or guidance tha
 
 Provide ONLY the reflection."""
 
-    payload = {
-        "model": GENERATION_MODEL,
-        "prompt": prompt,
-        "stream": False,
-        "options": {"temperature": 0.5},
-    }
-
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json=payload,
-            headers={"Content-Type": "application/json"},
-        )
-
-        if response.status_code == 200:
-            reflection = response.json().get("response", "").strip()
-            return reflection if reflection else "No reflection generated"
-        else:
-            print(f"Error: Received status code {response.status_code}")
-            return "Error generating reflection"
+        reflection = generate(GENERATION_MODEL, prompt, {"temperature": 0.5}).strip()
+        return reflection if reflection else "No reflection generated"
+    except GenerationError as e:
+        print(f"Error: {str(e)}")
+        return "Error generating reflection"
     except Exception as e:
         print(f"Error generating reflection: {str(e)}")
         return "Error"
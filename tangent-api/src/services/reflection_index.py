@@ -0,0 +1,86 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import REFLECTION_CONTEXT_CACHE_SIZE
+from services.embedding import request_embeddings
+
+_context_embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_context_lock = threading.Lock()
+
+
+def load_reflection_index(path: str) -> Dict:
+    """
+    Load reflections.json as one matrix of unit-length float32 embeddings.
+
+    Entries without a usable embedding are skipped, so every row of
+    ``matrix`` lines up with ``reflections``.
+    """
+    with open(path, "r") as f:
+        reflections_data = json.load(f)
+
+    cluster_ids, reflections, vectors = [], [], []
+    for cluster_id, data in reflections_data.items():
+        embedding = data.get("embedding")
+        if not embedding or not data.get("reflection"):
+            continue
+        if vectors and len(embedding) != len(vectors[0]):
+            continue
+        cluster_ids.append(cluster_id)
+        reflections.append(data["reflection"])
+        vectors.append(embedding)
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms > 0, norms, 1)
+    return {"cluster_ids": cluster_ids, "reflections": reflections, "matrix": matrix}
+
+
+def embed_context(text: str) -> Optional[np.ndarray]:
+    """
+    Embed a context string as a unit vector, remembering recent contexts.
+
+    Contexts are kept in a small in-memory LRU rather than the persistent
+    title cache. Failed requests are not cached.
+    """
+    with _context_lock:
+        vector = _context_embeddings.get(text)
+        if vector is not None:
+            _context_embeddings.move_to_end(text)
+            return vector
+
+    embeddings = request_embeddings([text])
+    if not embeddings:
+        return None
+    vector = np.asarray(embeddings[0], dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    vector /= norm
+
+    with _context_lock:
+        _context_embeddings[text] = vector
+        _context_embeddings.move_to_end(text)
+        while len(_context_embeddings) > REFLECTION_CONTEXT_CACHE_SIZE:
+            _context_embeddings.popitem(last=False)
+    return vector
+
+
+def top_reflections(
+    index: Dict, context_embedding: np.ndarray, k: int = 3, min_similarity=0.5
+) -> List[str]:
+    """Return up to ``k`` reflections most similar to the context, best first"""
+    matrix = index["matrix"]
+    if not len(matrix) or matrix.shape[1] != len(context_embedding):
+        return []
+
+    similarities = matrix @ context_embedding
+    k = min(k, len(similarities))
+    top = np.argpartition(-similarities, k - 1)[:k]
+    top = top[np.argsort(-similarities[top])]
+    return [
+        index["reflections"][i] for i in top if similarities[i] > min_similarity
+    ]
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import pandas as pd
+
+from config import GENERATION_CONCURRENCY, REFLECTION_MAX_MESSAGES
+from services.data_processing import identify_struggle_messages
+from services.embedding import request_embeddings
+from services.reflection import generate_reflection_for_cluster
+from utils import write_json_atomic
+
+# Labels generate_reflection_for_cluster returns instead of a reflection
+FAILED_REFLECTIONS = {"Error generating reflection", "Error", "No reflection generated"}
+
+
+def struggle_texts_by_cluster(messages: pd.DataFrame, titles, clusters) -> Dict:
+    """
+    Group struggle messages by the cluster of their chat branch.
+
+    Each cluster keeps its latest ``REFLECTION_MAX_MESSAGES`` struggle texts
+    and the titles of the branches they came from.
+    """
+    struggles = identify_struggle_messages(messages)
+    if struggles.empty:
+        return {}
+
+    cluster_of = dict(zip(titles, clusters))
+    struggle_titles = (
+        struggles["chat_name"].astype(str)
+        + " (Branch "
+        + struggles["branch_id"].astype(str)
+        + ")"
+    )
+    struggles = struggles.assign(
+        title=struggle_titles.to_numpy(),
+        cluster=struggle_titles.map(cluster_of).to_numpy(),
+    ).dropna(subset=["cluster"])
+
+    grouped = {}
+    for cluster_id, group in struggles.sort_values("timestamp").groupby("cluster"):
+        if cluster_id < 0:
+            continue
+        grouped[int(cluster_id)] = {
+            "texts": group["text"].astype(str).tolist()[-REFLECTION_MAX_MESSAGES:],
+            "titles": list(dict.fromkeys(group["title"])),
+        }
+    return grouped
+
+
+def struggle_hash(texts: List[str]) -> str:
+    return hashlib.sha1(json.dumps(texts).encode("utf-8")).hexdigest()
+
+
+def load_previous_reflections(data_dir: str) -> Dict[str, Dict]:
+    """Previous reflections keyed by the hash of the struggle texts behind them"""
+    try:
+        with open(os.path.join(data_dir, "reflections.json"), "r") as f:
+            previous = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return {
+        entry["struggle_hash"]: entry
+        for entry in previous.values()
+        if entry.get("struggle_hash") and entry.get("embedding")
+    }
+
+
+def update_reflections(
+    messages: pd.DataFrame, update: Dict, data_dir: str, concurrency=None
+) -> Dict[str, Dict]:
+    """
+    Write reflections.json for the latest state.
+
+    Only clusters whose struggle messages changed since the last run go to
+    the LLM, at most ``concurrency`` at a time. New reflections are embedded
+    in batches. Unchanged clusters reuse their previous reflection and
+    embedding even if their cluster id changed. Failed generations are left
+    out so that the next run retries them. Also writes
+    chats_with_reflections.json and fills in the reflection field of the
+    latest topics.
+    """
+    if concurrency is None:
+        concurrency = GENERATION_CONCURRENCY
+
+    grouped = struggle_texts_by_cluster(
+        messages, update["titles"], update["clusters"]
+    )
+    previous = load_previous_reflections(data_dir)
+
+    reflections = {}
+    pending = []
+    for cluster_id, group in grouped.items():
+        digest = struggle_hash(group["texts"])
+        entry = previous.get(digest)
+        if entry is not None:
+            reflections[str(cluster_id)] = {**entry, "titles": group["titles"]}
+        else:
+            pending.append((cluster_id, digest, group))
+
+    print(
+        f"Generating reflections for {len(pending)} clusters, "
+        f"reusing {len(reflections)}"
+    )
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            generated = list(
+                executor.map(
+                    generate_reflection_for_cluster,
+                    (group["texts"] for _, _, group in pending),
+                )
+            )
+
+        succeeded = [
+            (item, reflection)
+            for item, reflection in zip(pending, generated)
+            if reflection and reflection not in FAILED_REFLECTIONS
+        ]
+        embeddings = (
+            request_embeddings([reflection for _, reflection in succeeded])
+            if succeeded
+            else []
+        )
+        if embeddings is None:
+            print("Could not embed new reflections, they will be retried next run")
+            succeeded = []
+
+        for ((cluster_id, digest, group), reflection), embedding in zip(
+            succeeded, embeddings
+        ):
+            reflections[str(cluster_id)] = {
+                "reflection": reflection,
+                "embedding": list(embedding),
+                "struggle_hash": digest,
+                "titles": group["titles"],
+            }
+
+    write_json_atomic(os.path.join(data_dir, "reflections.json"), reflections)
+    write_json_atomic(
+        os.path.join(data_dir, "chats_with_reflections.json"),
+        sorted({title for entry in reflections.values() for title in entry["titles"]}),
+    )
+
+    topics = update["topics"]
+    for cluster_id, topic in topics.items():
+        entry = reflections.get(str(cluster_id))
+        topic["reflection"] = entry["reflection"] if entry else ""
+    write_json_atomic(os.path.join(data_dir, "topics.json"), topics)
+
+    return reflections
@@ -0,0 +1,223 @@
+import io
+import math
+import os
+from typing import Dict
+
+import numpy as np
+
+from config import LOD_LEVELS, LOD_POINT_LIMIT, LOD_TARGET_CELLS
+from utils import write_atomic
+
+INDEX_FILE = "spatial_index.npz"
+
+
+def _cell_coords(points, bounds, size):
+    """Grid cell (x, y) of each point on a size x size grid over ``bounds``"""
+    min_x, min_y, max_x, max_y = bounds
+    span_x = max(max_x - min_x, 1e-12)
+    span_y = max(max_y - min_y, 1e-12)
+    cell_x = ((points[:, 0] - min_x) / span_x * size).astype(np.int64)
+    cell_y = ((points[:, 1] - min_y) / span_y * size).astype(np.int64)
+    return np.clip(cell_x, 0, size - 1), np.clip(cell_y, 0, size - 1)
+
+
+def _cell_starts(cell_ids, size):
+    """CSR offsets: rows of cell c are [starts[c], starts[c + 1]) once sorted"""
+    counts = np.bincount(cell_ids, minlength=size * size)
+    return np.concatenate(([0], np.cumsum(counts))).astype(np.int32)
+
+
+def levels_for_points(points, bounds, max_levels: int = LOD_LEVELS) -> int:
+    """
+    Fewest grid levels, up to ``max_levels``, whose densest finest cell holds
+    at most a quarter of LOD_POINT_LIMIT.
+
+    Each level splits cells in four, so a uniform map needs about
+    log4(n / limit) + 1 levels. Levels are added from there until the densest
+    cell fits, since projected maps are far from uniform. Small maps get a
+    small pyramid instead of a fixed 2^max x 2^max grid.
+    """
+    n_points = len(points)
+    cell_limit = max(LOD_POINT_LIMIT // 4, 1)
+    if n_points <= cell_limit:
+        return 0
+    level = math.ceil(math.log(n_points / LOD_POINT_LIMIT, 4)) + 1
+    level = int(min(max(level, 0), max_levels))
+    while level < max_levels:
+        size = 1 << level
+        cell_x, cell_y = _cell_coords(points, bounds, size)
+        if np.bincount(cell_y * size + cell_x).max() <= cell_limit:
+            break
+        level += 1
+    return level
+
+
+def build_spatial_index(points, clusters, levels: int = LOD_LEVELS) -> Dict:
+    """
+    Build a grid pyramid over 2D points.
+
+    Level ``l`` is a 2^l x 2^l grid over the points' bounds. The pyramid
+    has up to ``levels`` levels, as many as ``levels_for_points`` needs. Each
+    level holds one blob per (cell, cluster) with its point count and
+    centroid, sorted by cell. The finest level also keeps the point order
+    sorted by cell, so the points inside a viewport are a few contiguous
+    slices. Offsets are int32.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    clusters = np.asarray(clusters, dtype=np.int64).reshape(-1)
+    if len(points):
+        bounds = np.array([*points.min(axis=0), *points.max(axis=0)])
+    else:
+        bounds = np.zeros(4)
+    levels = levels_for_points(points, bounds, levels)
+
+    # Blob keys combine cell and cluster, with labels shifted to start at 0
+    cluster_base = int(clusters.min()) if len(clusters) else 0
+    cluster_offset = clusters - cluster_base
+    cluster_span = int(cluster_offset.max()) + 1 if len(clusters) else 1
+
+    index = {"bounds": bounds, "levels": np.array(levels)}
+    for level in range(levels + 1):
+        size = 1 << level
+        cell_x, cell_y = _cell_coords(points, bounds, size)
+        cell_ids = cell_y * size + cell_x
+
+        if level == levels:
+            order = np.argsort(cell_ids, kind="stable")
+            index["point_order"] = order.astype(np.int32)
+            index["point_starts"] = _cell_starts(cell_ids, size)
+            index["point_xy"] = points.astype(np.float32)
+            index["point_cluster"] = clusters.astype(np.int32)
+
+        # One blob per (cell, cluster), sorted by cell then cluster
+        keys = cell_ids * cluster_span + cluster_offset
+        unique_keys, inverse, counts = np.unique(
+            keys, return_inverse=True, return_counts=True
+        )
+        sum_x = np.bincount(inverse, weights=points[:, 0], minlength=len(unique_keys))
+        sum_y = np.bincount(inverse, weights=points[:, 1], minlength=len(unique_keys))
+        blob_cells = unique_keys // cluster_span
+
+        index[f"blob_starts_{level}"] = _cell_starts(blob_cells, size)
+        index[f"blob_cluster_{level}"] = (
+            unique_keys % cluster_span + cluster_base
+        ).astype(np.int32)
+        index[f"blob_count_{level}"] = counts.astype(np.int32)
+        index[f"blob_xy_{level}"] = np.column_stack(
+            (sum_x / np.maximum(counts, 1), sum_y / np.maximum(counts, 1))
+        ).astype(np.float32)
+
+    return index
+
+
+def save_spatial_index(data_dir: str, points, clusters):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **build_spatial_index(points, clusters))
+    write_atomic(os.path.join(data_dir, INDEX_FILE), buffer.getvalue())
+
+
+def load_spatial_index(path: str) -> Dict:
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def _viewport_ranges(starts, bounds, size, viewport):
+    """
+    [start, end) row ranges, one per grid row, of the cells overlapping
+    ``viewport``. Their total length counts the entries without gathering them.
+    """
+    min_x, min_y, max_x, max_y = bounds
+    span_x = max(max_x - min_x, 1e-12)
+    span_y = max(max_y - min_y, 1e-12)
+    x0, y0, x1, y1 = viewport
+    if x1 < min_x or x0 > max_x or y1 < min_y or y0 > max_y:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    def to_cell(value, lower, span):
+        return int(np.clip(math.floor((value - lower) / span * size), 0, size - 1))
+
+    cx0, cx1 = to_cell(x0, min_x, span_x), to_cell(x1, min_x, span_x)
+    cy0, cy1 = to_cell(y0, min_y, span_y), to_cell(y1, min_y, span_y)
+
+    # Cells in one grid row are contiguous, so each row is a single slice
+    row_cells = np.arange(cy0, cy1 + 1) * size
+    return starts[row_cells + cx0], starts[row_cells + cx1 + 1]
+
+
+def _range_rows(row_start, row_end):
+    """Row positions covered by the ranges"""
+    if int((row_end - row_start).sum()) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(
+        [np.arange(start, end) for start, end in zip(row_start, row_end)]
+    )
+
+
+def _in_viewport(xy, viewport):
+    # Compare at the stored float32 precision, so points on the bounds count
+    x0, y0, x1, y1 = np.asarray(viewport, dtype=xy.dtype)
+    return (xy[:, 0] >= x0) & (xy[:, 0] <= x1) & (xy[:, 1] >= y0) & (xy[:, 1] <= y1)
+
+
+def query_spatial_index(
+    index: Dict, viewport=None, level=None, point_limit: int = LOD_POINT_LIMIT
+) -> Dict:
+    """
+    Return what is visible in ``viewport`` (x0, y0, x1, y1).
+
+    Without a ``level``, individual points are returned when at most
+    ``point_limit`` fall in the grid cells under the viewport, and otherwise
+    the cluster blobs of the finest level with at most LOD_TARGET_CELLS cells
+    across the viewport. An explicit ``level`` below the finest always
+    returns that level's blobs. The finest level returns points when they
+    are within the limit.
+    """
+    bounds = index["bounds"]
+    levels = int(index["levels"])
+    if viewport is None:
+        viewport = tuple(bounds)
+    x0, y0, x1, y1 = viewport
+    viewport = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+
+    auto_level = level is None
+    if auto_level:
+        extent = max(bounds[2] - bounds[0], bounds[3] - bounds[1], 1e-12)
+        view_extent = max(viewport[2] - viewport[0], viewport[3] - viewport[1], 1e-12)
+        level = math.floor(math.log2(max(LOD_TARGET_CELLS * extent / view_extent, 1)))
+    level = int(min(max(level, 0), levels))
+
+    if auto_level or level == levels:
+        row_start, row_end = _viewport_ranges(
+            index["point_starts"], bounds, 1 << levels, viewport
+        )
+        # Count from the cell offsets first, so a crowded viewport never
+        # gathers its points only to fall back to blobs
+        if int((row_end - row_start).sum()) <= point_limit:
+            return _visible_points(index, _range_rows(row_start, row_end), viewport)
+
+    size = 1 << level
+    rows = _range_rows(
+        *_viewport_ranges(index[f"blob_starts_{level}"], bounds, size, viewport)
+    )
+    xy = index[f"blob_xy_{level}"][rows]
+    return {
+        "mode": "clusters",
+        "level": level,
+        "xy": xy,
+        "clusters": index[f"blob_cluster_{level}"][rows],
+        "counts": index[f"blob_count_{level}"][rows],
+    }
+
+
+def _visible_points(index: Dict, rows, viewport) -> Dict:
+    """Points at the given rows of the finest level that lie inside ``viewport``"""
+    point_ids = index["point_order"][rows]
+    point_ids = point_ids[_in_viewport(index["point_xy"][point_ids], viewport)]
+    return {
+        "mode": "points",
+        "level": int(index["levels"]),
+        "indices": point_ids,
+        "xy": index["point_xy"][point_ids],
+        "clusters": index["point_cluster"][point_ids],
+    }
@@ -0,0 +1,117 @@
+import re
+import threading
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import STRUGGLE_DETECTION_CHUNK_SIZE, STRUGGLE_PHRASES_FILE
+
+DEFAULT_STRUGGLE_PHRASES = [
+    "I'm struggling with",
+    "I don't understand",
+    "This is confusing",
+    "I'm stuck on",
+    "Need help with",
+    "This doesn't make sense",
+    "Can't figure out",
+    "Having trouble with",
+    "Not sure how to",
+    "Difficult to",
+    "Problem with",
+    "Issue with",
+    "Error when",
+    "Failing to",
+]
+
+
+def load_struggle_phrases(path: Optional[str] = STRUGGLE_PHRASES_FILE) -> List[str]:
+    """Read one phrase per line from ``path``, or use the default phrases"""
+    if not path:
+        return list(DEFAULT_STRUGGLE_PHRASES)
+    with open(path, "r", encoding="utf-8") as f:
+        phrases = [line.strip() for line in f]
+    return [phrase for phrase in phrases if phrase and not phrase.startswith("#")]
+
+
+def build_phrase_pattern(phrases: Iterable[str]) -> str:
+    """
+    Build one regex matching any phrase, factored as a trie.
+
+    Phrases sharing a prefix share one branch ("i'm s(?:truggling with|tuck
+    on)"), so the regex engine tests each position against a single tree
+    instead of trying every phrase in turn. Phrases are escaped and
+    lowercased. A phrase that extends a shorter one is dropped, since the
+    pattern is only used to test whether a text contains any phrase.
+    """
+    trie = {}
+    for phrase in phrases:
+        phrase = phrase.lower()
+        if not phrase:
+            continue
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        if "" in node:
+            return ""
+        branches = [re.escape(char) + build(child) for char, child in node.items()]
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(sorted(branches)) + ")"
+
+    if not trie:
+        # Matches nothing
+        return r"(?!)"
+    return build(trie)
+
+
+class StruggleDetector:
+    """
+    Flags messages that contain any struggle phrase.
+
+    The phrase set is compiled once into a single pattern over lowercased text.
+    Text is scanned in chunks, so very large frames or streamed batches never
+    build one huge intermediate result.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases = list(phrases)
+        # Text is lowercased before matching, which is several times faster
+        # than a case-insensitive pattern
+        self.pattern = re.compile(build_phrase_pattern(self.phrases))
+
+    def flags(
+        self, texts: pd.Series, chunk_size: int = STRUGGLE_DETECTION_CHUNK_SIZE
+    ) -> np.ndarray:
+        """Return a boolean array, True where the text contains a phrase"""
+        if not len(texts):
+            return np.zeros(0, dtype=bool)
+        return np.concatenate(list(self.iter_flags(texts, chunk_size)))
+
+    def iter_flags(
+        self, texts: pd.Series, chunk_size: int = STRUGGLE_DETECTION_CHUNK_SIZE
+    ) -> Iterator[np.ndarray]:
+        for start in range(0, len(texts), chunk_size):
+            chunk = texts.iloc[start : start + chunk_size]
+            yield (
+                chunk.astype("str")
+                .str.lower()
+                .str.contains(self.pattern, na=False)
+                .to_numpy(dtype=bool, na_value=False)
+            )
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_struggle_detector() -> StruggleDetector:
+    """Return the process-wide detector for the configured phrases"""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = StruggleDetector(load_struggle_phrases())
+        return _detector
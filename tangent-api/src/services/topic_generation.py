@@ -1,8 +1,20 @@
-import requests
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    GENERATION_CONCURRENCY,
+    TOPIC_BATCH_MAX_TITLES,
+    TOPIC_BATCH_SIZE,
+    TOPIC_LABELLING_MODE,
+)
+from services.ollama_client import GenerationError, generate
 
 GENERATION_MODEL = os.getenv("GENERATION_MODEL", "qwen2.5-coder:7b")
 
+# Labels generate_topic_for_cluster returns when generation fails
+TOPIC_FAILURE_LABELS = {"Error generating topic", "Error"}
+
 
 def generate_topic_for_cluster(titles):
     """Generate a topic label for a cluster of titles"""
@@ -19,26 +31,119 @@ Provide ONLY the topic label, nothing else. Examples:
 "API Integration"
 """
 
-    payload = {
-        "model": GENERATION_MODEL,
-        "prompt": prompt,
-        "stream": False,
-        "options": {"temperature": 0.2},
-    }
-
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json=payload,
-            headers={"Content-Type": "application/json"},
-        )
-
-        if response.status_code == 200:
-            topic = response.json().get("response", "").strip()
-            return topic if topic else "Miscellaneous"
-        else:
-            print(f"Error: Received status code {response.status_code}")
-            return "Error generating topic"
+        topic = generate(GENERATION_MODEL, prompt, {"temperature": 0.2}).strip()
+        return topic if topic else "Miscellaneous"
+    except GenerationError as e:
+        print(f"Error: {str(e)}")
+        return "Error generating topic"
     except Exception as e:
         print(f"Error generating topic: {str(e)}")
         return "Error"
+
+
+def _valid_label(label):
+    """Clean a label from structured output, or return None if it is unusable"""
+    if not isinstance(label, str):
+        return None
+    label = label.strip().strip('"').strip()
+    if not label or len(label) > 60 or len(label.split()) > 8:
+        return None
+    return label
+
+
+def is_usable_topic(label):
+    """True if a stored label is a real topic rather than a failure or junk"""
+    return label not in TOPIC_FAILURE_LABELS and _valid_label(label) is not None
+
+
+def generate_topics_batch(cluster_titles):
+    """
+    Label several clusters with one structured prompt.
+
+    Returns labels only for the clusters whose entry in the model's JSON
+    output is present and valid; callers fall back for the rest.
+    """
+    keys = {str(cluster_id): cluster_id for cluster_id in cluster_titles}
+    sections = []
+    for key, cluster_id in keys.items():
+        titles = cluster_titles[cluster_id][:TOPIC_BATCH_MAX_TITLES]
+        titles_text = "\n".join(f"- {title}" for title in titles)
+        sections.append(f"Cluster {key}:\n{titles_text}")
+    clusters_text = "\n\n".join(sections)
+
+    prompt = f"""You are a technical topic analyzer. Each cluster below lists related titles. For every cluster, provide a single concise topic label (2-4 words) that best describes their common theme.
+
+{clusters_text}
+
+Respond with ONLY a JSON object mapping each cluster id to its label, for example:
+{{"1": "Network Security Tools", "2": "UI Animation Design"}}
+"""
+
+    try:
+        response = generate(
+            GENERATION_MODEL, prompt, {"temperature": 0.2}, response_format="json"
+        )
+        parsed = json.loads(response)
+    except GenerationError as e:
+        print(f"Error: {str(e)}")
+        return {}
+    except Exception as e:
+        print(f"Error generating batched topics: {str(e)}")
+        return {}
+
+    if not isinstance(parsed, dict):
+        return {}
+    # Some models wrap the mapping in a single top-level key
+    if len(parsed) == 1 and isinstance(next(iter(parsed.values())), dict):
+        parsed = next(iter(parsed.values()))
+
+    labels = {}
+    for key, cluster_id in keys.items():
+        label = _valid_label(parsed.get(key))
+        if label is not None:
+            labels[cluster_id] = label
+    return labels
+
+
+def generate_topics_for_clusters(
+    cluster_titles, concurrency=GENERATION_CONCURRENCY, mode=TOPIC_LABELLING_MODE
+):
+    """
+    Generate topic labels for many clusters at once.
+
+    In "batched" mode clusters are grouped into structured prompts of
+    ``TOPIC_BATCH_SIZE``. Any cluster missing from a batch's output is
+    labelled on its own. Calls run concurrently, up to ``concurrency`` at a
+    time, each with its own timeout, and a failed cluster gets the same error
+    label as ``generate_topic_for_cluster`` without affecting the others.
+    """
+    cluster_ids = list(cluster_titles)
+    if not cluster_ids:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        topics = {}
+        if mode == "batched" and len(cluster_ids) > 1:
+            batches = [
+                {
+                    cluster_id: cluster_titles[cluster_id]
+                    for cluster_id in cluster_ids[start : start + TOPIC_BATCH_SIZE]
+                }
+                for start in range(0, len(cluster_ids), TOPIC_BATCH_SIZE)
+            ]
+            for labels in executor.map(generate_topics_batch, batches):
+                topics.update(labels)
+
+        remaining = [
+            cluster_id for cluster_id in cluster_ids if cluster_id not in topics
+        ]
+        if topics and remaining:
+            print(f"Falling back to single prompts for {len(remaining)} clusters")
+        fallback = executor.map(
+            generate_topic_for_cluster,
+            (cluster_titles[cluster_id] for cluster_id in remaining),
+        )
+        topics.update(zip(remaining, fallback))
+
+    return {cluster_id: topics[cluster_id] for cluster_id in cluster_ids}
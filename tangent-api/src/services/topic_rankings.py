@@ -0,0 +1,124 @@
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import TOPIC_MESSAGES_TOP_N
+from services.message_embeddings import get_message_embedding_store
+from utils import write_json_atomic
+
+TOPIC_MESSAGES_FILE = "topic_messages.json"
+
+
+def rank_topic_messages(
+    messages: pd.DataFrame,
+    titles,
+    clusters,
+    vectors: Callable[[pd.DataFrame], Optional[Tuple[np.ndarray, np.ndarray]]],
+    top_n: int = TOPIC_MESSAGES_TOP_N,
+) -> Dict[str, Dict]:
+    """
+    Rank each topic's messages by 0.6 * cosine similarity to the topic
+    centroid + 0.4 * length relative to the topic's longest message.
+
+    ``vectors`` returns a (matrix, rows) pair giving each message's row in
+    ``matrix``, or -1 if it has none. Each topic gathers and normalizes only
+    its own rows, so the matrix can be a memory map that is never copied
+    whole. Returns {cluster_id: {"centroid", "messages"}} with the top
+    ``top_n`` messages of each topic, best first.
+    """
+    cluster_of = dict(zip(titles, clusters))
+    branch_titles = (
+        messages["chat_name"].astype(str)
+        + " (Branch "
+        + messages["branch_id"].astype(str)
+        + ")"
+    )
+    message_clusters = branch_titles.map(cluster_of)
+    has_text = messages["text"].astype(str).str.strip().str.len() > 0
+    selected = (message_clusters.notna() & has_text).to_numpy()
+    messages = messages[selected]
+    message_clusters = message_clusters[selected].astype(int).to_numpy()
+    if messages.empty:
+        return {}
+
+    result = vectors(messages)
+    if result is None:
+        raise RuntimeError("Could not embed messages for topic rankings")
+    matrix, vector_rows = result
+    stored = vector_rows >= 0
+    messages = messages[stored]
+    message_clusters = message_clusters[stored]
+    vector_rows = vector_rows[stored]
+    lengths = messages["text"].astype(str).str.len().to_numpy()
+
+    rankings = {}
+    for cluster_id in np.unique(message_clusters):
+        if cluster_id < 0:
+            continue
+        rows = np.flatnonzero(message_clusters == cluster_id)
+        embeddings = np.asarray(matrix[vector_rows[rows]], dtype=np.float32)
+        centroid = embeddings.mean(axis=0)
+        centroid_norm = np.linalg.norm(centroid)
+        norms = np.linalg.norm(embeddings, axis=1)
+        embeddings /= np.where(norms > 0, norms, 1)[:, None]
+        similarities = embeddings @ (centroid / max(centroid_norm, 1e-12))
+        length_scores = lengths[rows] / max(lengths[rows].max(), 1)
+        scores = 0.6 * similarities + 0.4 * length_scores
+
+        k = min(top_n, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        records = json.loads(
+            messages.iloc[rows[top]].to_json(orient="records", date_format="iso")
+        )
+        rankings[str(int(cluster_id))] = {
+            "centroid": centroid.tolist(),
+            "messages": records,
+        }
+    return rankings
+
+
+def rerank_by_context(records: List[Dict], vectors: Dict, context_embedding):
+    """
+    Order a topic's ranked messages by cosine similarity to a context.
+
+    ``vectors`` comes from ``open_message_vectors``. Only the records' own rows
+    are read from the memory map. Messages without a stored vector keep their
+    ranked order after the rest.
+    """
+    keys = [
+        (str(record.get("chat_id") or ""), str(record.get("message_id") or ""))
+        for record in records
+    ]
+    rows = np.array([vectors["rows"].get(key, -1) for key in keys], dtype=np.int64)
+    if not len(rows) or len(context_embedding) != vectors["dim"]:
+        return records
+
+    scores = np.full(len(rows), -np.inf)
+    stored = rows >= 0
+    embeddings = np.asarray(vectors["matrix"][rows[stored]], dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1)
+    scores[stored] = (embeddings @ context_embedding) / np.where(norms > 0, norms, 1)
+    return [records[i] for i in np.argsort(-scores, kind="stable")]
+
+
+def update_topic_rankings(
+    messages: pd.DataFrame, update: Dict, data_dir: str, vectors=None
+):
+    """
+    Write the per-topic message rankings for the latest state.
+
+    Message vectors come from the data dir's message embedding store, so
+    only messages new since the last run are embedded.
+    """
+    if vectors is None:
+        vectors = get_message_embedding_store(data_dir).vectors_for
+    rankings = rank_topic_messages(
+        messages, update["titles"], update["clusters"], vectors=vectors
+    )
+    write_json_atomic(os.path.join(data_dir, TOPIC_MESSAGES_FILE), rankings)
+    print(f"Ranked messages for {len(rankings)} topics")
+    return rankings
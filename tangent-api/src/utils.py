@@ -1,6 +1,27 @@
 import os
 import json
 from config import BASE_DATA_DIR, CLAUDE_DATA_DIR, CHATGPT_DATA_DIR
+from services.artifact_cache import get_artifact_cache
+
+
+def write_atomic(path: str, content):
+    """
+    Write text or bytes to a temp file next to ``path`` and swap it in with
+    os.replace, so readers never see a partly written file.
+    """
+    tmp_path = f"{path}.tmp"
+    if isinstance(content, bytes):
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+    else:
+        # Untranslated UTF-8, which byte offsets into text files rely on
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+    os.replace(tmp_path, path)
+
+
+def write_json_atomic(path: str, data):
+    write_atomic(path, json.dumps(data))
 
 def check_files_exist(data_dir: str) -> dict:
     REQUIRED_FILES = [
@@ -47,49 +68,21 @@ def ensure_directories():
 def load_visualization_data(data_dir: str) -> dict:
     """Load visualization data from the specified directory."""
     try:
-        data = {}
-
-        # Load embeddings
-        embeddings_path = os.path.join(data_dir, "embeddings_2d.json")
-        if os.path.exists(embeddings_path):
-            with open(embeddings_path, "r") as f:
-                data["points"] = json.load(f)
-        else:
-            data["points"] = []
-
-        # Load clusters
-        clusters_path = os.path.join(data_dir, "clusters.json")
-        if os.path.exists(clusters_path):
-            with open(clusters_path, "r") as f:
-                data["clusters"] = json.load(f)
-        else:
-            data["clusters"] = []
-
-        # Load topics
-        topics_path = os.path.join(data_dir, "topics.json")
-        if os.path.exists(topics_path):
-            with open(topics_path, "r") as f:
-                data["topics"] = json.load(f)
-        else:
-            data["topics"] = {}
-
-        # Load chat titles (now include branch info)
-        titles_path = os.path.join(data_dir, "chat_titles.json")
-        if os.path.exists(titles_path):
-            with open(titles_path, "r") as f:
-                data["titles"] = json.load(f)
-        else:
-            data["titles"] = []
-
-        # Load chats with reflections
-        reflections_path = os.path.join(data_dir, "chats_with_reflections.json")
-        if os.path.exists(reflections_path):
-            with open(reflections_path, "r") as f:
-                data["chats_with_reflections"] = json.load(f)
-        else:
-            data["chats_with_reflections"] = []
-
-        return data
+        cache = get_artifact_cache()
+        return {
+            # Load embeddings
+            "points": cache.get(data_dir, "embeddings_2d.json", default=[]),
+            # Load clusters
+            "clusters": cache.get(data_dir, "clusters.json", default=[]),
+            # Load topics
+            "topics": cache.get(data_dir, "topics.json", default={}),
+            # Load chat titles (now include branch info)
+            "titles": cache.get(data_dir, "chat_titles.json", default=[]),
+            # Load chats with reflections
+            "chats_with_reflections": cache.get(
+                data_dir, "chats_with_reflections.json", default=[]
+            ),
+        }
 
     except Exception as e:
         print(f"Error loading visualization data: {str(e)}")
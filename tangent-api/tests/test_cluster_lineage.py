@@ -0,0 +1,53 @@
+import numpy as np
+
+import services.clustering as clustering
+from services.cluster_lineage import ClusterLineage
+
+
+def cluster_stats(clusters):
+    return {
+        int(cluster_id): {
+            "coherence": 0.9,
+            "radius": 0.1,
+            "medoid": int(np.flatnonzero(clusters == cluster_id)[0]),
+        }
+        for cluster_id in np.unique(clusters)
+    }
+
+
+def label_month(lineage, month, clusters, titles):
+    matches = lineage.match(clusters, titles)
+    carried = lineage.carried_metadata(matches)
+    metadata = clustering.generate_cluster_metadata(
+        clusters, titles, cluster_stats(clusters), carried
+    )
+    lineage.update(month, clusters, titles, metadata, matches)
+    return metadata
+
+
+def test_failed_label_is_regenerated_next_month(monkeypatch):
+    titles = [f"chat {i} (Branch 0)" for i in range(6)]
+    clusters = np.array([0, 0, 0, 1, 1, 1])
+    requested = []
+
+    def failing_topics(cluster_titles):
+        requested.append(set(cluster_titles))
+        return {0: "Error generating topic", 1: "Web Scraping"}
+
+    def working_topics(cluster_titles):
+        requested.append(set(cluster_titles))
+        return {cluster_id: "Database Design" for cluster_id in cluster_titles}
+
+    lineage = ClusterLineage(min_overlap=0.5)
+    monkeypatch.setattr(clustering, "generate_topics_for_clusters", failing_topics)
+    first = label_month(lineage, "2024-01", clusters, titles)
+    assert first["0"]["topic"] == "Error generating topic"
+
+    monkeypatch.setattr(clustering, "generate_topics_for_clusters", working_topics)
+    second = label_month(lineage, "2024-02", clusters, titles)
+
+    # Only the cluster whose label failed goes back to the LLM
+    assert requested[-1] == {0}
+    assert second["0"]["topic"] == "Database Design"
+    assert second["1"]["topic"] == "Web Scraping"
+    assert second["0"]["lineage_id"] == first["0"]["lineage_id"]
@@ -0,0 +1,39 @@
+from services.conversation_tree import walk_branches
+
+
+def test_walk_branches_labels_forks():
+    parent_of = {
+        "root": None,
+        "a": "root",
+        "b1": "a",
+        "b2": "a",
+        "c1": "b1",
+        "orphan": "missing",
+    }
+    walked = list(walk_branches(list(parent_of), parent_of))
+
+    assert walked == [
+        ("root", "0", False),
+        ("a", "0", True),
+        ("b1", "0.0", False),
+        ("c1", "0.0", False),
+        ("b2", "0.1", False),
+        ("orphan", "0", False),
+    ]
+
+
+def test_walk_branches_handles_very_long_chats():
+    node_ids = [str(i) for i in range(200000)]
+    parent_of = {node_id: str(int(node_id) - 1) for node_id in node_ids[1:]}
+
+    walked = list(walk_branches(node_ids, parent_of))
+
+    assert len(walked) == len(node_ids)
+    assert {branch_id for _, branch_id, _ in walked} == {"0"}
+
+
+def test_walk_branches_visits_each_node_once_in_a_cycle():
+    parent_of = {"a": None, "b": "c", "c": "b"}
+    walked = list(walk_branches(list(parent_of), parent_of))
+
+    assert [node_id for node_id, _, _ in walked] == ["a"]
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+
+from services.embedding_cache import EmbeddingCache
+
+
+def vectors(*values):
+    return np.array([[value] * 4 for value in values], dtype=np.float32)
+
+
+def test_vectors_appended_after_the_saved_index_are_trimmed(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", max_entries=100)
+    cache.put_many(["a", "b"], vectors(1, 2))
+    # A batch appended but never flushed, as after a crash
+    cache.put_many(["c"], vectors(3), save=False)
+
+    reopened = EmbeddingCache(str(tmp_path), "model", max_entries=100)
+
+    assert os.path.getsize(reopened.vectors_path) == 2 * 4 * 4
+    found, missing = reopened.get_many(["a", "b", "c"])
+    assert missing == [2]
+    assert found[1].tolist() == [2.0] * 4
+
+
+def test_vectors_shorter_than_the_index_clear_the_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", max_entries=100)
+    cache.put_many(["a", "b"], vectors(1, 2))
+    with open(cache.vectors_path, "r+b") as f:
+        f.truncate(4 * 4)
+
+    reopened = EmbeddingCache(str(tmp_path), "model", max_entries=100)
+
+    assert reopened.get_many(["a", "b"]) == ({}, [0, 1])
+
+
+def test_eviction_keeps_recent_vectors_across_reopen(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", max_entries=4)
+    cache.put_many(["a", "b", "c", "d"], vectors(1, 2, 3, 4))
+    cache.get_many(["d"])
+    cache.put_many(["e"], vectors(5), save=False)
+
+    # Eviction saves its index at once, so an unflushed batch still reloads
+    reopened = EmbeddingCache(str(tmp_path), "model", max_entries=4)
+    found, missing = reopened.get_many(["d", "e"])
+
+    assert len(reopened.rows) == 3
+    assert missing == []
+    assert found[0].tolist() == [4.0] * 4
+    assert found[1].tolist() == [5.0] * 4
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from services.ingestion import iter_json_array
+
+ELEMENTS = [
+    {"name": "small", "messages": []},
+    {
+        "name": "large",
+        "text": "x" * 5000 + ' ☕ " ] , [',
+        "nested": [[1, 2], {"a": None}],
+    },
+    12345678901234567890,
+    -1.5e10,
+    "string with ] and , inside",
+    [],
+    True,
+    None,
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_iter_json_array_yields_every_element(tmp_path, chunk_size):
+    path = tmp_path / "export.json"
+    # BOM and odd whitespace around elements, as some exports have
+    body = " ,\n\t".join(json.dumps(e, ensure_ascii=False) for e in ELEMENTS)
+    text = "\ufeff [\n" + body + "\n] \n"
+    path.write_text(text, encoding="utf-8")
+
+    assert list(iter_json_array(str(path), chunk_size=chunk_size)) == ELEMENTS
+
+
+def test_iter_json_array_reports_truncated_files(tmp_path):
+    path = tmp_path / "export.json"
+    path.write_text('[{"name": "a"}, {"name": "b"', encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(str(path), chunk_size=4))
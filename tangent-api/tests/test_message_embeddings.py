@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import services.message_embeddings as message_embeddings
+from services.message_embeddings import MessageEmbeddingStore, open_message_vectors
+from services.topic_rankings import rerank_by_context
+
+
+def fake_embeddings(texts):
+    return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+
+def messages_frame(texts, chat_ids=None, message_ids=None):
+    count = len(texts)
+    return pd.DataFrame(
+        {
+            "chat_id": chat_ids or ["chat"] * count,
+            "message_id": message_ids or [str(i) for i in range(count)],
+            "text": texts,
+        }
+    )
+
+
+def test_reader_never_modifies_a_store_being_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(message_embeddings, "request_embeddings", fake_embeddings)
+    store_dir = str(tmp_path / "store")
+    store = MessageEmbeddingStore(store_dir)
+    store.fill(messages_frame(["a", "bb", "ccc"]))
+
+    # An append in progress: vectors written, index lines not yet
+    vectors_path = os.path.join(store_dir, "vectors.f32")
+    with open(vectors_path, "ab") as f:
+        f.write(np.ones((2, 3), dtype=np.float32).tobytes())
+    size = os.path.getsize(vectors_path)
+
+    vectors = open_message_vectors(store_dir)
+
+    assert os.path.getsize(vectors_path) == size
+    assert vectors["matrix"].shape == (3, 3)
+    assert vectors["rows"][("chat", "1")] == 1
+    assert vectors["matrix"][1][0] == 2.0
+
+
+def test_rows_are_keyed_on_chat_and_message_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(message_embeddings, "request_embeddings", fake_embeddings)
+    store = MessageEmbeddingStore(str(tmp_path / "store"))
+    rows = store.fill(
+        messages_frame(
+            ["a", "bb", "ccc"], chat_ids=["x", "y", "y"], message_ids=["1", "1", ""]
+        )
+    )
+
+    assert rows[0] != rows[1] and min(rows[:2]) >= 0
+    # Messages without an id are never stored
+    assert rows[2] == -1
+
+
+def test_rerank_by_context_reads_only_stored_vectors(tmp_path, monkeypatch):
+    monkeypatch.setattr(message_embeddings, "request_embeddings", fake_embeddings)
+    store_dir = str(tmp_path / "store")
+    MessageEmbeddingStore(store_dir).fill(messages_frame(["a", "bbbbbbbb"]))
+    records = [
+        {"chat_id": "chat", "message_id": "missing"},
+        {"chat_id": "chat", "message_id": "0"},
+        {"chat_id": "chat", "message_id": "1"},
+    ]
+
+    ranked = rerank_by_context(
+        records, open_message_vectors(store_dir), np.array([1.0, 0.0, 0.0])
+    )
+
+    assert [record["message_id"] for record in ranked] == ["1", "0", "missing"]
@@ -0,0 +1,97 @@
+import os
+
+import pandas as pd
+
+from services.message_store import MessageStore, load_chat_messages
+
+TEXTS = [
+    "plain",
+    "multi\nline\r\ntext",
+    "naïve café ☕",
+    "line separator",
+    "next\x85line",
+    "emoji 🙂 and \"quotes\"",
+]
+
+
+def messages_frame():
+    rows = []
+    for i in range(24):
+        rows.append(
+            {
+                "chat_name": ["zeta", "alpha", "mid"][i % 3],
+                "branch_id": ["0", "0.1"][i // 3 % 2],
+                "timestamp": pd.Timestamp("2024-01-01") + pd.Timedelta(hours=i),
+                "text": TEXTS[i % len(TEXTS)],
+            }
+        )
+    df = pd.DataFrame(rows)
+    # Categories out of alphabetical order, as from the columnar reader
+    df["chat_name"] = pd.Categorical(
+        df["chat_name"], categories=["zeta", "mid", "alpha"]
+    )
+    df["branch_id"] = df["branch_id"].astype("category")
+    return df
+
+
+def write_run(data_dir, df):
+    store = MessageStore(str(data_dir))
+    store.begin()
+    store.append_segment("2024-01", df.iloc[:12])
+    store.append_segment("2024-02", df.iloc[12:])
+    store.finish()
+    return store
+
+
+def test_read_chat_matches_filtering_all_messages(tmp_path):
+    store = write_run(tmp_path, messages_frame())
+    all_messages = store.read_messages()
+
+    assert sorted(m["text"] for m in all_messages) == sorted(
+        messages_frame()["text"]
+    )
+    for chat_name in ("zeta", "mid", "alpha"):
+        for branch_id in ("0", "0.1"):
+            expected = sorted(
+                (
+                    m
+                    for m in all_messages
+                    if m["chat_name"] == chat_name and m["branch_id"] == branch_id
+                ),
+                key=lambda m: m["timestamp"],
+            )
+            assert store.read_chat(chat_name, branch_id) == expected
+
+        whole_chat = load_chat_messages(str(tmp_path), chat_name)
+        assert sorted(whole_chat, key=lambda m: m["timestamp"]) == sorted(
+            (m for m in all_messages if m["chat_name"] == chat_name),
+            key=lambda m: m["timestamp"],
+        )
+
+
+def test_rerun_with_same_messages_reuses_segment_files(tmp_path):
+    store = write_run(tmp_path, messages_frame())
+    before = {
+        name: os.stat(os.path.join(store.store_dir, name)).st_mtime_ns
+        for name in os.listdir(store.store_dir)
+        if name.startswith("segment_")
+    }
+
+    store = write_run(tmp_path, messages_frame())
+    after = {
+        name: os.stat(os.path.join(store.store_dir, name)).st_mtime_ns
+        for name in os.listdir(store.store_dir)
+        if name.startswith("segment_")
+    }
+
+    assert after == before
+
+
+def test_run_without_segments_keeps_previous_messages(tmp_path):
+    write_run(tmp_path, messages_frame())
+
+    store = MessageStore(str(tmp_path))
+    store.begin()
+    store.finish()
+
+    assert len(store.read_messages()) == 24
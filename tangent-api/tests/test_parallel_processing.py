@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Run as __main__ so that every spawned worker re-imports it, and with it the
+# whole app, the way workers started from the API process do
+ENTRY_SCRIPT = textwrap.dedent(
+    """
+    import os
+    import sys
+    import threading
+
+    sys.path.insert(0, {src_dir!r})
+    import app  # noqa: F401
+
+    with open(os.path.join({marker_dir!r}, f"{{os.getpid()}}.txt"), "w") as f:
+        f.write(str(threading.active_count()))
+
+    if __name__ == "__main__":
+        import numpy as np
+        from services import parallel_processing
+
+        rng = np.random.default_rng(0)
+        parallel_processing.get_embeddings_array = lambda titles: rng.normal(
+            size=(len(titles), 16)
+        ).astype(np.float32)
+        months = [
+            (month, [f"chat {{month}} {{i}} (Branch 0)" for i in range(30)], 30)
+            for month in ("2024-01", "2024-02")
+        ]
+        done = [
+            month
+            for month, *_ in parallel_processing.process_months_parallel(months, 2)
+        ]
+        print("MONTHS " + ",".join(done))
+    """
+)
+
+
+def test_workers_start_under_app_entry_point(tmp_path):
+    marker_dir = tmp_path / "markers"
+    marker_dir.mkdir()
+    script = tmp_path / "entry.py"
+    script.write_text(
+        ENTRY_SCRIPT.format(src_dir=SRC_DIR, marker_dir=str(marker_dir))
+    )
+
+    result = subprocess.run(
+        [sys.executable, str(script)],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        timeout=600,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert "MONTHS 2024-01,2024-02" in result.stdout
+    thread_counts = [int(path.read_text()) for path in marker_dir.iterdir()]
+    # The parent and at least one worker imported the app
+    assert len(thread_counts) >= 2
+    # Importing the app must not start the background processing thread
+    assert thread_counts == [1] * len(thread_counts)
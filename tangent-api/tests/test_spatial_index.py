@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+
+from services.spatial_index import (
+    INDEX_FILE,
+    load_spatial_index,
+    query_spatial_index,
+    save_spatial_index,
+)
+
+
+def saved_index(tmp_path, points, clusters):
+    save_spatial_index(str(tmp_path), points, clusters)
+    return load_spatial_index(os.path.join(tmp_path, INDEX_FILE))
+
+
+def test_small_map_is_a_small_file_with_every_point(tmp_path):
+    rng = np.random.default_rng(0)
+    points = rng.normal(size=(120, 2))
+    index = saved_index(tmp_path, points, rng.integers(0, 5, 120))
+
+    assert os.path.getsize(os.path.join(tmp_path, INDEX_FILE)) < 20_000
+    result = query_spatial_index(index)
+    assert result["mode"] == "points"
+    assert sorted(result["indices"].tolist()) == list(range(120))
+
+
+def test_zoomed_in_dense_map_returns_the_points_in_view(tmp_path):
+    rng = np.random.default_rng(1)
+    points = rng.normal(size=(50_000, 2))
+    index = saved_index(tmp_path, points, rng.integers(0, 20, 50_000))
+    viewport = (0.0, 0.0, 0.1, 0.1)
+
+    result = query_spatial_index(index, viewport)
+
+    inside = np.flatnonzero(
+        (points[:, 0] >= 0) & (points[:, 0] <= 0.1)
+        & (points[:, 1] >= 0) & (points[:, 1] <= 0.1)
+    )
+    assert result["mode"] == "points"
+    assert sorted(result["indices"].tolist()) == inside.tolist()
+    assert query_spatial_index(index)["mode"] == "clusters"
+    # An explicit coarse level is honored even where points would fit
+    assert query_spatial_index(index, viewport, level=1)["mode"] == "clusters"